@@ -0,0 +1,77 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AsyncBatchQueue:
+    """Coalesce concurrent requests into batches handled by a single call"""
+
+    def __init__(self, handler: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch: int = 8, max_wait: float = 0.1):
+        """
+        Args:
+            handler: Coroutine taking a list of items and returning one result per item, in order
+            max_batch: Flush as soon as this many items are pending
+            max_wait: Seconds to wait for more items before flushing a partial batch
+                while another batch is in flight; when idle, items submitted in the
+                same event loop iteration are flushed together on the next one
+        """
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            # Nothing in flight means nothing to wait for; don't make a lone request pay the timer
+            self._timer = loop.call_later(self.max_wait if self._running else 0, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Dispatch everything pending as one batch"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            self._running += 1
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run the handler and hand each result back to its caller"""
+        logger.debug("Dispatching batch of %d request(s)", len(batch))
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except BaseException as e:
+            # Resolve every caller, including when the batch task is cancelled on shutdown
+            for _, future in batch:
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        finally:
+            self._running -= 1
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+        for _, future in batch[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError("Batch handler returned fewer results than requests"))
@@ -0,0 +1,40 @@
+import threading
+import time
+
+class CircuitBreaker:
+    """Thread-safe breaker that fails fast for a cooldown after consecutive failures"""
+
+    def __init__(self, threshold: int, cooldown: float):
+        """
+        Args:
+            threshold: Consecutive failures that open the breaker
+            cooldown: Seconds the breaker stays open before calls are tried again
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """Whether calls should be rejected without being attempted"""
+        with self._lock:
+            return time.monotonic() < self._open_until
+
+    def record_success(self):
+        """Close the breaker and reset the failure count"""
+        with self._lock:
+            self._failures = 0
+            self._open_until = 0.0
+
+    def record_failure(self):
+        """
+        Count a failure, opening the breaker once the threshold is reached
+
+        The count is kept while open, so a failed trial call after the
+        cooldown reopens the breaker straight away.
+        """
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._open_until = time.monotonic() + self.cooldown
@@ -0,0 +1,34 @@
+import logging
+import uuid
+from typing import Optional
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+class PresignedImageUploader:
+    """Upload prepared photos to an S3-compatible bucket and hand out short-lived GET URLs"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, url_ttl: int = 60):
+        """
+        Args:
+            bucket: Bucket the photos are written to; a lifecycle rule should expire them
+            endpoint_url: S3-compatible endpoint (e.g. Cloudflare R2); None uses AWS S3
+            url_ttl: Seconds the presigned URL stays valid
+        """
+        if boto3 is None:
+            raise ImportError("boto3 is required for IMAGE_UPLOAD_BUCKET")
+        self.bucket = bucket
+        self.url_ttl = url_ttl
+        self._client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def upload(self, data: bytes, mime_type: str) -> str:
+        """Store the image bytes under a random key and return a presigned URL for them"""
+        key = f"meal-photos/{uuid.uuid4().hex}"
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=mime_type)
+        return self._client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_ttl
+        )
@@ -0,0 +1,518 @@
+"""
+AI prompts for food analysis and calorie estimation
+"""
+
+import bisect
+import functools
+import hashlib
+import json
+import random
+import time
+from importlib import resources
+from string import Template
+from types import MappingProxyType
+from typing import NamedTuple
+
+from utils.config import Config
+
+# Structured-output schema for the calorie analysis response, passed to the
+# API as a strict response_format so the shape is enforced at decode time;
+# the prompt itself only says to fill it
+# health_category is sent as an index into this tuple to save output tokens
+HEALTH_CATEGORIES = ("healthy", "moderate", "junk")
+
+_FOOD_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "description": "Actual food/drink item, e.g. 'Orange Juice' not 'orange liquid with straw'"},
+        "portion": {"type": "string", "description": "Portion size with measurements based on the image"},
+        "calories": {"type": "number"},
+        "carbs": {"type": "number"},
+        "protein": {"type": "number"},
+        "fat": {"type": "number"},
+        "cooking_method": {"type": "string", "description": "Preparation method observed"},
+        "health_score": {"type": "number", "minimum": 1, "maximum": 10}
+    },
+    "required": ["name", "portion", "calories", "carbs", "protein", "fat", "cooking_method", "health_score"],
+    "additionalProperties": False
+}
+
+CALORIE_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        # Headline fields first so a streamed reply can show them early
+        "description": {"type": "string", "description": "Comma-separated food/drink items only, no containers or utensils"},
+        "total_calories": {"type": "number"},
+        "food_items": {"type": "array", "items": _FOOD_ITEM_SCHEMA},
+        "total_carbs": {"type": "number"},
+        "total_protein": {"type": "number"},
+        "total_fat": {"type": "number"},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 100},
+        "health_category": {"type": "integer", "enum": [0, 1, 2], "description": "0=healthy 1=moderate 2=junk"},
+        "health_score": {"type": "number", "minimum": 1, "maximum": 10},
+        "witty_comment": {"type": "string", "description": "Specific, personalized comment about this meal"},
+        "recommendations": {"type": "string", "description": "Specific, actionable advice for this meal"},
+        "fun_fact": {"type": "string", "description": "Nutritional or food fact related to this meal"},
+        "user_input_acknowledged": {"type": ["string", "null"], "description": "Brief confirmation of the user's caption, null if none"},
+        # Not shown to users; kept last so a streamed reply can stop before it
+        "notes": {"type": "string", "description": "Observations and assumptions made during the analysis"}
+    },
+    "required": [
+        "description", "total_calories", "food_items", "total_carbs", "total_protein", "total_fat",
+        "confidence", "health_category", "health_score", "witty_comment", "recommendations",
+        "fun_fact", "user_input_acknowledged", "notes"
+    ],
+    "additionalProperties": False
+}
+
+# Multi-image requests wrap one analysis per photo, in order
+CALORIE_BATCH_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "analyses": {"type": "array", "items": CALORIE_JSON_SCHEMA}
+    },
+    "required": ["analyses"],
+    "additionalProperties": False
+}
+
+# Structured-output schema for the junk food reality-check follow-up
+REALITY_CHECK_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "witty_comment": {"type": "string", "description": "Reality check specific to this meal"},
+        "recommendations": {"type": "string", "description": "Concrete healthier swaps for this meal"}
+    },
+    "required": ["witty_comment", "recommendations"],
+    "additionalProperties": False
+}
+
+# Short wire names for multi-word response fields; each repeated key costs
+# output tokens, so the schema sent to the model uses these and the parser
+# expands them back
+SHORT_KEYS = {
+    "food_items": "fi",
+    "cooking_method": "cm",
+    "health_score": "hs",
+    "total_calories": "tc",
+    "total_carbs": "tcb",
+    "total_protein": "tp",
+    "total_fat": "tf",
+    "health_category": "hc",
+    "witty_comment": "wc",
+    "recommendations": "rec",
+    "fun_fact": "ff",
+    "user_input_acknowledged": "uia",
+}
+LONG_KEYS = {short: long for long, short in SHORT_KEYS.items()}
+
+def _shorten_schema(schema):
+    """Rename object properties to their short wire names, keeping the long name in the description"""
+    if schema.get("type") == "array":
+        return {**schema, "items": _shorten_schema(schema["items"])}
+    if schema.get("type") != "object":
+        return schema
+
+    properties = {}
+    for name, prop in schema["properties"].items():
+        prop = _shorten_schema(prop)
+        if name in SHORT_KEYS:
+            description = f"{name}: {prop['description']}" if "description" in prop else name
+            prop = {**prop, "description": description}
+        properties[SHORT_KEYS.get(name, name)] = prop
+
+    return {
+        **schema,
+        "properties": properties,
+        "required": [SHORT_KEYS.get(name, name) for name in schema.get("required", [])]
+    }
+
+def expand_keys(value):
+    """Recursively map short wire names back to full field names; long names pass through"""
+    if isinstance(value, dict):
+        return {LONG_KEYS.get(key, key): expand_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand_keys(item) for item in value]
+    return value
+
+@functools.cache
+def get_response_schema(short_keys=False, batch=False):
+    """Return the response schema to send, optionally with short keys and wrapped for multi-image requests"""
+    schema = _shorten_schema(CALORIE_JSON_SCHEMA) if short_keys else CALORIE_JSON_SCHEMA
+    if batch:
+        return {**CALORIE_BATCH_JSON_SCHEMA, "properties": {"analyses": {"type": "array", "items": schema}}}
+    return schema
+
+def _read_prompt_file(name):
+    """Read a prompt text file shipped alongside this package"""
+    return resources.files(__package__).joinpath(name).read_text(encoding="utf-8")
+
+@functools.cache
+def get_prompt(fast=False):
+    """
+    Return the calorie analysis prompt, reading it from calorie_prompt.txt on first use
+
+    Junk food guidance is not part of this prompt; it is sent in a follow-up
+    call only for meals the first pass categorizes as junk. The fast variant
+    also drops the challenging-image guidance and is used for the cheap first
+    pass of the model cascade. With PROMPT_RULEBOOK_IN_CONTEXT off, the
+    rulebook (see get_prompt_rulebook) is left out of every variant.
+    """
+    in_context = Config.PROMPT_RULEBOOK_IN_CONTEXT
+    return Template(_read_prompt_file("calorie_prompt.txt")).substitute(
+        format_rules=_read_prompt_file("format_rules.txt"),
+        portion_reference=_read_prompt_file("portion_reference.txt") if in_context else "",
+        challenging_images=_read_prompt_file("challenging_images.txt") if in_context and not fast else ""
+    )
+
+def get_prompt_rulebook():
+    """Portion tables and challenging-image guidance, for fine-tuning a model that runs without them"""
+    return _read_prompt_file("portion_reference.txt") + _read_prompt_file("challenging_images.txt")
+
+@functools.cache
+def get_meal_description_prompt():
+    """Return the diary-entry description prompt, reading it on first use"""
+    return Template(_read_prompt_file("meal_description.txt")).substitute(
+        format_rules=_read_prompt_file("format_rules.txt")
+    )
+
+@functools.cache
+def get_confidence_prompt():
+    """Return the confidence explanation prompt, reading it on first use"""
+    return _read_prompt_file("confidence.txt")
+
+# Tokenizer encoding used for prompt cost estimates
+PROMPT_TOKENIZER = "cl100k_base"
+
+def count_tokens(text, encoding=PROMPT_TOKENIZER):
+    """Count tokens with tiktoken when available, else estimate ~4 bytes per token"""
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding(encoding).encode(text))
+    except Exception:
+        return len(text.encode('utf-8')) // 4
+
+@functools.cache
+def get_prompt_token_count(fast=False):
+    """Token count of the calorie prompt, computed once for per-request cost estimates"""
+    return count_tokens(get_prompt(fast=True) if fast else get_prompt())
+
+# Bump whenever get_prompt_source_hash() changes; tests pin the hash per
+# version so prompt edits (even whitespace, which breaks provider prefix
+# caching) are always deliberate
+PROMPT_VERSION = 4
+
+@functools.cache
+def get_prompt_source_hash():
+    """Short hash of every shipped prompt file, the response schema and the per-request templates"""
+    hasher = hashlib.blake2b(digest_size=8)
+    files = sorted((entry for entry in resources.files(__package__).iterdir() if entry.name.endswith(".txt")),
+                   key=lambda entry: entry.name)
+    for entry in files:
+        hasher.update(entry.name.encode('utf-8'))
+        hasher.update(entry.read_bytes())
+    hasher.update(json.dumps(CALORIE_JSON_SCHEMA, sort_keys=True).encode('utf-8'))
+    hasher.update(json.dumps(REALITY_CHECK_JSON_SCHEMA, sort_keys=True).encode('utf-8'))
+    hasher.update(CAPTION_OVERRIDE_TEMPLATE.encode('utf-8'))
+    hasher.update(CALORIE_ANALYSIS_PROMPT_DYNAMIC.encode('utf-8'))
+    hasher.update(BATCH_INSTRUCTION_TEMPLATE.encode('utf-8'))
+    return hasher.hexdigest()
+
+@functools.cache
+def get_prompt_hash():
+    """
+    Hash of the prompt version, prompt sources and rendered prompts, used to version cached analyses
+
+    Covers the per-request templates (caption override, dynamic and batch
+    instructions) through get_prompt_source_hash(), so editing any of them
+    invalidates cached analyses.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(str(PROMPT_VERSION).encode('utf-8'))
+    hasher.update(get_prompt_source_hash().encode('ascii'))
+    hasher.update(get_prompt().encode('utf-8'))
+    hasher.update(get_prompt(fast=True).encode('utf-8'))
+    return hasher.hexdigest()
+
+def __getattr__(name):
+    """Materialize the prompt constants and PROMPT_HASH lazily on first attribute access"""
+    if name in ('CALORIE_ANALYSIS_PROMPT', 'CALORIE_ANALYSIS_PROMPT_STATIC'):
+        return get_prompt()
+    if name == 'MEAL_DESCRIPTION_PROMPT':
+        return get_meal_description_prompt()
+    if name == 'CONFIDENCE_EXPLANATION_PROMPT':
+        return get_confidence_prompt()
+    if name == 'JUNK_FOOD_ADDENDUM':
+        return get_junk_food_addendum()
+    if name == 'JUNK_FOOD_RULES':
+        return _read_prompt_file("junk_food_rules.txt")
+    if name == 'REALITY_CHECK_EXAMPLES':
+        return _read_prompt_file("reality_check_examples.txt")
+    if name == 'ENHANCED_HEALTH_WARNING_PROMPT':
+        return get_health_warning_template()
+    if name == 'CALORIE_PROMPT_TOKENS':
+        return get_prompt_token_count()
+    if name == 'PROMPT_HASH':
+        return get_prompt_hash()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Rotating per-request instruction to discourage template responses
+ANALYSIS_INSTRUCTIONS = (
+    "ANALYZE THIS SPECIFIC IMAGE - Do not use template examples!",
+    "LOOK AT THE ACTUAL FOOD - Describe what you really see!",
+    "EXAMINE THIS UNIQUE PHOTO - Give fresh analysis!",
+    "FOCUS ON THIS IMAGE - No generic responses!",
+    "STUDY THIS MEAL - Provide original analysis!",
+)
+
+# Per-request caption override; the caption rules themselves live in
+# calorie_prompt.txt so only this short template is formatted per call
+CAPTION_OVERRIDE_TEMPLATE = """
+
+**OVERRIDE ALL VISUAL ANALYSIS - USER KNOWS BEST**
+The user explicitly stated: "{caption}"
+Use their exact food name, amount and modifications; use the image only to estimate portion size.
+"""
+
+@functools.lru_cache(maxsize=256)
+def render_caption_block(caption):
+    """Render the caption override block; a few common captions dominate traffic, so keep them cached"""
+    return CAPTION_OVERRIDE_TEMPLATE.format(caption=caption) if caption else ""
+
+@functools.cache
+def get_calorie_prompt_blocks(fast=False):
+    """
+    Return the static prompt as content blocks marked for provider prompt caching
+
+    Anything per-request belongs after these blocks so the cached prefix
+    stays identical across calls.
+    """
+    return [
+        {
+            "type": "text",
+            "text": get_prompt(fast=True) if fast else get_prompt(),
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]
+
+@functools.cache
+def get_calorie_system_message(fast=False):
+    """
+    Return the cached system message carrying the static prompt
+
+    Built once and shared by every request; callers must not mutate it.
+    """
+    return {
+        "role": "system",
+        "content": get_calorie_prompt_blocks(fast=True) if fast else get_calorie_prompt_blocks()
+    }
+
+# Per-request suffix sent as the user message; everything static stays in
+# the cached system prompt
+CALORIE_ANALYSIS_PROMPT_DYNAMIC = "{instruction}{caption_block}\n\nAnalysis Timestamp: {timestamp} (Ensure fresh analysis)"
+
+def build_calorie_messages(image_base64, caption=None, timestamp=None, fast=False, mime_type="image/jpeg",
+                           image_url=None):
+    """
+    Build the chat messages for a calorie analysis request
+
+    The static prompt goes in a system message marked for provider prompt
+    caching; only the short dynamic suffix and the image vary per call.
+    Pass fast=True to use the shorter prompt for the cheap cascade model, and
+    mime_type to match the encoding of image_base64. Captioned photos also get
+    the shorter prompt: the caption names the food, so the challenging-image
+    guidance for reasoning from color and texture is never used. An
+    image_url (e.g. a presigned upload) is sent instead of the inline image.
+    """
+    fast = fast or bool(caption)
+    user_text = CALORIE_ANALYSIS_PROMPT_DYNAMIC.format(
+        instruction=random.choice(ANALYSIS_INSTRUCTIONS),
+        caption_block=render_caption_block(caption),
+        timestamp=timestamp if timestamp is not None else int(time.time() * 1000)
+    )
+    return [
+        get_calorie_system_message(fast=True) if fast else get_calorie_system_message(),
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": user_text
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": image_url or f"data:{mime_type};base64,{image_base64}"
+                    }
+                }
+            ]
+        }
+    ]
+
+# Multi-image request framing; kept in the user message so the cached
+# system prompt is shared with single-image requests
+BATCH_INSTRUCTION_TEMPLATE = """{count} separate meal photos follow. Analyze each photo independently, in order, applying every rule above to each one.
+Return a single JSON object {{"analyses": [...]}} containing exactly {count} analyses, one per photo, in the same order."""
+
+def build_batch_calorie_messages(items, timestamp=None, mime_type="image/jpeg"):
+    """
+    Build the chat messages for analyzing several photos in one request
+
+    Args:
+        items: List of (image_base64, caption, image_url) triples; image_url (e.g. a
+            presigned upload) is sent instead of the inline image when not None
+    """
+    user_content = [{
+        "type": "text",
+        "text": CALORIE_ANALYSIS_PROMPT_DYNAMIC.format(
+            instruction=BATCH_INSTRUCTION_TEMPLATE.format(count=len(items)),
+            caption_block="",
+            timestamp=timestamp if timestamp is not None else int(time.time() * 1000)
+        )
+    }]
+    for index, (image_base64, caption, image_url) in enumerate(items, 1):
+        user_content.append({"type": "text", "text": f"Photo {index}:{render_caption_block(caption)}"})
+        user_content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": image_url or f"data:{mime_type};base64,{image_base64}"
+            }
+        })
+
+    return [
+        get_calorie_system_message(),
+        {
+            "role": "user",
+            "content": user_content
+        }
+    ]
+
+@functools.cache
+def get_junk_food_addendum():
+    """
+    Return the follow-up prompt for meals categorized as junk food, reading it on first use
+
+    The reality-check rules and few-shot examples live only here, never in
+    the per-request prompt.
+    """
+    return Template(_read_prompt_file("junk_food_addendum.txt")).substitute(
+        junk_food_rules=_read_prompt_file("junk_food_rules.txt"),
+        reality_check_examples=_read_prompt_file("reality_check_examples.txt")
+    )
+
+# Enhanced prompt with profound health warnings
+@functools.cache
+def get_health_warning_template():
+    """Return the health warning prompt template, reading it on first use"""
+    return Template(_read_prompt_file("health_warning.txt"))
+
+# Metrics assumed for any field the caller does not supply
+DEFAULT_HEALTH_CONTEXT = MappingProxyType({
+    'visceral_fat': 16.8,
+    'body_fat': 30,
+    'muscle_mass': 35,
+    'metabolic_age': 45,
+    'bmi': 28
+})
+
+@functools.lru_cache(maxsize=128)
+def _build_enhanced_prompt(visceral_fat, body_fat, muscle_mass, metabolic_age, bmi):
+    """Render the health warning prompt for one set of metrics"""
+    return get_health_warning_template().substitute(
+        visceral_fat=visceral_fat, body_fat=body_fat, muscle_mass=muscle_mass,
+        metabolic_age=metabolic_age, bmi=bmi
+    )
+
+def get_enhanced_prompt(health_context=None):
+    """
+    Generate enhanced AI prompt with profound health warnings
+
+    Args:
+        health_context: User's health metrics (visceral fat, BMI, etc.)
+    """
+    # No metrics, or exactly the defaults, is the common case and needs no merge
+    if not health_context or health_context == DEFAULT_HEALTH_CONTEXT:
+        return _build_enhanced_prompt(*DEFAULT_HEALTH_CONTEXT.values())
+
+    # Customize the enhanced prompt based on user's metrics in a single
+    # substitution pass; repeat metrics are served from the render cache
+    metrics = {**DEFAULT_HEALTH_CONTEXT, **(health_context or {})}
+    return _build_enhanced_prompt(*(metrics[name] for name in DEFAULT_HEALTH_CONTEXT))
+
+# Warning templates for different scenarios
+WARNING_TEMPLATES = {
+    'high_sugar': """
+🚨 GLYCEMIC CATASTROPHE DETECTED 🚨
+This sugar bomb is triggering a metabolic emergency. Your blood glucose is skyrocketing to dangerous levels, forcing your pancreas into overdrive. With your visceral fat at ${vf_level}, your cells are already insulin resistant - this meal is literally programming diabetes into your DNA.
+""",
+
+    'high_fat_junk': """
+💀 ARTERIAL DESTRUCTION IN PROGRESS 💀
+This toxic fat payload is coating your arteries with inflammatory compounds. Each bite deposits cholesterol directly into your blood vessel walls. Your ${vf_level} visceral fat is amplifying the damage by 300%. Heart attack risk increasing in real-time.
+""",
+
+    'processed_food': """
+⚠️ CHEMICAL WARFARE ON YOUR CELLS ⚠️
+This ultra-processed disaster contains 15+ inflammatory compounds attacking your cellular machinery. Preservatives disrupting gut bacteria. Additives triggering autoimmune responses. Your organs are under siege from synthetic toxins.
+""",
+
+    'excessive_calories': """
+🔥 METABOLIC OVERLOAD - SYSTEM FAILURE 🔥
+${calories} calories overwhelming every metabolic pathway. Your liver cannot process this energy tsunami. Excess converting directly to visceral fat. You've just added ${fat_gain}g of toxic organ fat. Recovery time: 72 hours of perfect eating.
+"""
+}
+
+# Compiled once; placeholders use string.Template syntax
+_WARNING_TEMPLATES_COMPILED = {key: Template(text) for key, text in WARNING_TEMPLATES.items()}
+
+def format_warning(key, **kwargs):
+    """Fill a warning template; placeholders without a value are left as-is"""
+    return _WARNING_TEMPLATES_COMPILED[key].safe_substitute(kwargs)
+
+class ThresholdRange(NamedTuple):
+    """Inclusive bounds of one threshold band"""
+    low: float
+    high: float
+
+    def __contains__(self, value):
+        return self.low <= value <= self.high
+
+# Built once and read-only, so callers can share it freely
+_CRITICAL_THRESHOLDS = MappingProxyType({
+    'visceral_fat': MappingProxyType({
+        'optimal': ThresholdRange(1, 9),
+        'warning': ThresholdRange(10, 12),
+        'danger': ThresholdRange(13, 15),
+        'critical': ThresholdRange(16, 30)  # User is here at 16.8
+    }),
+    'calories': MappingProxyType({
+        'light': ThresholdRange(0, 300),
+        'moderate': ThresholdRange(301, 500),
+        'heavy': ThresholdRange(501, 700),
+        'excessive': ThresholdRange(701, 2000)
+    }),
+    'health_score': MappingProxyType({
+        'excellent': ThresholdRange(9, 10),
+        'good': ThresholdRange(7, 8),
+        'moderate': ThresholdRange(5, 6),
+        'poor': ThresholdRange(3, 4),
+        'dangerous': ThresholdRange(1, 2)
+    })
+})
+
+def get_critical_thresholds():
+    """Define critical health thresholds for warnings"""
+    return _CRITICAL_THRESHOLDS
+
+# Visceral fat levels where each severity starts, and the prefix for each band
+_SEVERITY_THRESHOLDS = (10, 13, 16, 18)
+_SEVERITY_PREFIXES = (
+    "📊 HEALTH ANALYSIS",
+    "⚡ WARNING - METABOLIC HEALTH DECLINING ⚡",
+    "⚠️ DANGER ZONE - HIGH DISEASE RISK ⚠️",
+    "🚨⚠️ CRITICAL HEALTH CRISIS - SEVERE METABOLIC DYSFUNCTION ⚠️🚨",
+    "💀🚨 MEDICAL EMERGENCY - IMMEDIATE INTERVENTION REQUIRED 🚨💀",
+)
+
+def format_warning_by_severity(visceral_fat_level):
+    """Generate warning prefix based on visceral fat severity"""
+    return _SEVERITY_PREFIXES[bisect.bisect_right(_SEVERITY_THRESHOLDS, visceral_fat_level)]
@@ -0,0 +1,30 @@
+import threading
+import time
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` calls per `period` seconds, with bursts up to `rate`"""
+
+    def __init__(self, rate: int, period: float = 60.0):
+        """
+        Args:
+            rate: Calls allowed per period
+            period: Length of the period in seconds
+        """
+        self.capacity = float(rate)
+        self._fill_rate = rate / period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._fill_rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._fill_rate
+            time.sleep(wait)
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import sqlite3
+import time
+import unicodedata
+from typing import Optional, Dict, Any
+import logging
+
+import numpy as np
+from PIL import Image
+
+from utils.helpers import loads_json
+
+logger = logging.getLogger(__name__)
+
+class _SQLiteCache:
+    """Connection and TTL handling shared by the analysis caches; each creates its own table"""
+
+    def __init__(self, db_path: str, ttl_seconds: Optional[int] = None):
+        """
+        Args:
+            db_path: SQLite database file
+            ttl_seconds: Entries older than this are ignored and purged; None keeps them forever
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.init_cache()
+
+    def _oldest_fresh(self) -> float:
+        """Creation time of the oldest entry still within the TTL"""
+        return time.time() - self.ttl_seconds if self.ttl_seconds is not None else 0.0
+
+    def get_connection(self):
+        """Get cache database connection"""
+        return sqlite3.connect(self.db_path)
+
+    def init_cache(self):
+        """Create the cache table if needed"""
+        raise NotImplementedError
+
+class ResponseCache(_SQLiteCache):
+    """SQLite cache of finished analyses keyed by image, caption and prompt version"""
+
+    def init_cache(self):
+        """Create the cache table if needed"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    cache_key BLOB PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+
+    @staticmethod
+    def make_key(image_bytes: bytes, caption: Optional[str], prompt_hash: str) -> bytes:
+        """Build a cache key; a new prompt hash invalidates every older entry"""
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update(image_bytes)
+        hasher.update(b'\x00' + (caption or '').encode('utf-8'))
+        hasher.update(b'\x00' + prompt_hash.encode('ascii'))
+        return hasher.digest()
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        """Return the cached analysis for key, or None on a miss"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute(
+                    'SELECT response FROM analysis_cache WHERE cache_key = ? AND created_at >= ?',
+                    (key, self._oldest_fresh())
+                ).fetchone()
+            return loads_json(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"Analysis cache read failed: {e}")
+            return None
+
+    def put(self, key: bytes, analysis: Dict[str, Any]):
+        """Store a finished analysis and drop expired entries"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO analysis_cache (cache_key, response, created_at) VALUES (?, ?, ?)',
+                    (key, json.dumps(analysis), time.time())
+                )
+                if self.ttl_seconds is not None:
+                    conn.execute('DELETE FROM analysis_cache WHERE created_at < ?', (self._oldest_fresh(),))
+        except Exception as e:
+            logger.warning(f"Analysis cache write failed: {e}")
+
+
+def _memoize_on_image(image: Image.Image, attribute: str, compute):
+    """
+    Compute a value from an image once and keep it on the image object
+
+    A photo can pass through the batch path, the per-photo fallback and
+    retries; each reuses the stored value instead of rescanning the pixels.
+    Images must not be modified in place once analyzed.
+    """
+    value = getattr(image, attribute, None)
+    if value is None:
+        value = compute(image)
+        setattr(image, attribute, value)
+    return value
+
+def _compute_image_digest(image: Image.Image) -> bytes:
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('ascii'))
+    hasher.update(image.tobytes())
+    return hasher.digest()
+
+def image_digest(image: Image.Image) -> bytes:
+    """Digest of an image's mode, size and raw pixels, computed once per image"""
+    return _memoize_on_image(image, '_mealmetrics_digest', _compute_image_digest)
+
+# DCT-II basis for the 32x32 perceptual hash, built once
+_PHASH_SIZE = 32
+_PHASH_DCT = np.cos(
+    np.pi * np.outer(np.arange(_PHASH_SIZE), 2 * np.arange(_PHASH_SIZE) + 1) / (2 * _PHASH_SIZE)
+)
+
+def perceptual_hash(image: Image.Image) -> int:
+    """64-bit DCT perceptual hash, computed once per image; near-identical photos differ in only a few bits"""
+    return _memoize_on_image(image, '_mealmetrics_phash', _compute_perceptual_hash)
+
+def _compute_perceptual_hash(image: Image.Image) -> int:
+    pixels = np.asarray(
+        image.convert('L').resize((_PHASH_SIZE, _PHASH_SIZE), Image.LANCZOS), dtype=np.float64
+    )
+    low_freq = (_PHASH_DCT @ pixels @ _PHASH_DCT.T)[:8, :8]
+    bits = (low_freq > np.median(low_freq)).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+def normalize_caption(caption: Optional[str]) -> str:
+    """
+    Reduce a caption to casefolded words so trivial variations share a key
+
+    Punctuation, separators and control characters split words; letters,
+    digits, combining marks and symbols such as emoji in any script are kept.
+    """
+    text = unicodedata.normalize('NFKC', caption or '').casefold()
+    return ' '.join(''.join(
+        ' ' if unicodedata.category(char)[0] in 'PZC' else char for char in text
+    ).split())
+
+class SemanticCache(_SQLiteCache):
+    """Near-duplicate cache: same normalized caption and a perceptual hash within a few bits"""
+
+    def __init__(self, db_path: str, max_distance: int = 6, ttl_seconds: int = 24 * 3600,
+                 max_candidates: int = 500):
+        self.max_distance = max_distance
+        self.max_candidates = max_candidates
+        super().__init__(db_path, ttl_seconds)
+
+    def init_cache(self):
+        """Create the semantic cache table if needed"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS semantic_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    caption_key TEXT NOT NULL,
+                    prompt_hash TEXT NOT NULL,
+                    phash TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_semantic_cache_lookup
+                ON semantic_cache (caption_key, prompt_hash, created_at)
+            ''')
+
+    def lookup(self, phash: int, caption: Optional[str], prompt_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the closest fresh analysis within max_distance bits, or None"""
+        try:
+            with self.get_connection() as conn:
+                rows = conn.execute(
+                    '''SELECT phash, response FROM semantic_cache
+                       WHERE caption_key = ? AND prompt_hash = ? AND created_at >= ?
+                       ORDER BY created_at DESC LIMIT ?''',
+                    (normalize_caption(caption), prompt_hash, self._oldest_fresh(), self.max_candidates)
+                ).fetchall()
+        except Exception as e:
+            logger.warning(f"Semantic cache read failed: {e}")
+            return None
+
+        best_response, best_distance = None, self.max_distance + 1
+        for stored_phash, response in rows:
+            distance = bin(phash ^ int(stored_phash, 16)).count('1')
+            if distance < best_distance:
+                best_response, best_distance = response, distance
+
+        if best_response is None:
+            return None
+        logger.debug("Semantic cache hit at distance %d", best_distance)
+        return loads_json(best_response)
+
+    def store(self, phash: int, caption: Optional[str], prompt_hash: str, analysis: Dict[str, Any]):
+        """Store a finished analysis and drop expired entries"""
+        now = time.time()
+        try:
+            with self.get_connection() as conn:
+                conn.execute(
+                    '''INSERT INTO semantic_cache (caption_key, prompt_hash, phash, response, created_at)
+                       VALUES (?, ?, ?, ?, ?)''',
+                    (normalize_caption(caption), prompt_hash, f"{phash:016x}", json.dumps(analysis), now)
+                )
+                conn.execute('DELETE FROM semantic_cache WHERE created_at < ?', (self._oldest_fresh(),))
+        except Exception as e:
+            logger.warning(f"Semantic cache write failed: {e}")
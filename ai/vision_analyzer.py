@@ -1,16 +1,113 @@
+import asyncio
+import copy
+import functools
+import base64
+import gzip
 import json
 import logging
+import random
+import re
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
-import hashlib
+from collections import OrderedDict
 from PIL import Image
-from typing import Dict, Any, Optional, Tuple
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from utils.config import Config
-from utils.helpers import pil_image_to_base64, resize_image_if_needed, parse_numeric_value, escape_markdown_safe, enhance_image_for_analysis
-from .prompts import CALORIE_ANALYSIS_PROMPT
+from utils.helpers import pil_image_to_base64, resize_image_if_needed, parse_numeric_value, escape_markdown_safe, enhance_image_for_analysis, loads_json, dumps_json
+from .prompts import (
+    get_prompt_hash, build_calorie_messages, build_batch_calorie_messages,
+    get_response_schema, expand_keys, get_junk_food_addendum, HEALTH_CATEGORIES, SHORT_KEYS,
+    REALITY_CHECK_JSON_SCHEMA
+)
+from .batching import AsyncBatchQueue
+from .circuit_breaker import CircuitBreaker
+from .rate_limit import RateLimiter
+from .image_upload import PresignedImageUploader
+from .response_cache import ResponseCache, SemanticCache, image_digest, perceptual_hash
 
 logger = logging.getLogger(__name__)
 
+# Transient failures retried against the same model before falling back
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+MAX_ATTEMPTS_PER_MODEL = 3
+# Exponential backoff bounds in seconds
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 10.0
+
+# Output budget floor for ":thinking" model variants, whose reasoning tokens
+# count against max_tokens
+THINKING_MIN_MAX_TOKENS = 2500
+
+# Pooled connections to the API, one per concurrently analyzed photo
+HTTP_POOL_SIZE = 16
+
+# Extra headers for Claude-routed requests so the cached system prompt is reused
+ANTHROPIC_CACHE_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+# Encoded uploads kept for photos re-analyzed with a new caption or after a
+# failed multi-image request
+PREPARED_IMAGE_CACHE_SIZE = 16
+
+# Health score indicators, indexed by the (capped) score
+SCORE_STARS = tuple('⭐' * count for count in range(6))
+SCORE_SKULLS = tuple('💀' * count for count in range(4))
+SCORE_WARNINGS = tuple('⚠️' * count for count in range(4))
+
+REQUIRED_ANALYSIS_FIELDS = ('description', 'total_calories', 'confidence')
+# Filled in when the model leaves a field out
+ANALYSIS_DEFAULTS = {
+    'health_category': 'moderate',
+    'health_score': 5,
+    'witty_comment': '',
+    'recommendations': '',
+    'fun_fact': '',
+    'total_carbs': 0,
+    'total_protein': 0,
+    'total_fat': 0,
+}
+
+# (default, minimum, maximum) for the numbers in an analysis and in each of its
+# food items, matching the bounds in CALORIE_JSON_SCHEMA
+ANALYSIS_NUMBER_RANGES = {
+    'total_calories': (0.0, 0.0, None),
+    'confidence': (70.0, 0.0, 100.0),
+    'total_carbs': (0.0, 0.0, None),
+    'total_protein': (0.0, 0.0, None),
+    'total_fat': (0.0, 0.0, None),
+    'health_score': (5.0, 1.0, 10.0),
+}
+FOOD_ITEM_NUMBER_RANGES = {
+    'calories': (0.0, 0.0, None),
+    'carbs': (0.0, 0.0, None),
+    'protein': (0.0, 0.0, None),
+    'fat': (0.0, 0.0, None),
+    'health_score': (5.0, 1.0, 10.0),
+}
+
+def _normalize_numbers(values: Dict[str, Any], ranges: Dict[str, Tuple[float, float, Optional[float]]]):
+    """Coerce the fields present in `values` to floats clamped to their range, in place"""
+    for field, (default, minimum, maximum) in ranges.items():
+        if field in values:
+            number = parse_numeric_value(values[field], default)
+            # Plain comparisons rather than min()/max() calls; this runs for every field
+            if number < minimum:
+                number = minimum
+            elif maximum is not None and number > maximum:
+                number = maximum
+            values[field] = number
+
+@functools.lru_cache(maxsize=None)
+def _top_level_key_pattern(key: str) -> re.Pattern:
+    """Compiled pattern for the comma that opens `key` in a JSON object, built once per key"""
+    return re.compile(r',\s*"' + re.escape(key) + r'"\s*:')
+
+@functools.lru_cache(maxsize=None)
+def _scalar_value_pattern(key: str) -> re.Pattern:
+    """Compiled pattern for `key` with a complete scalar value, closed by its trailing comma or brace"""
+    return re.compile(r'[{,]\s*"' + re.escape(key) + r'"\s*:\s*("(?:[^"\\]|\\.)*"|[^\s,}\]"]+)\s*[,}]')
+
 class VisionAnalyzer:
     """AI-powered food image analysis for calorie estimation"""
 
@@ -18,35 +115,216 @@ class VisionAnalyzer:
         self.api_key = Config.OPENROUTER_API_KEY
         self.model = Config.OPENROUTER_MODEL
         self.base_url = Config.OPENROUTER_BASE_URL
-        # NO CACHE - Each image gets fresh analysis for accuracy
+        # One keep-alive pool for every request, so only the first call to the
+        # API pays for the TCP and TLS handshake; sized for the worker threads
+        # that analyze a batch concurrently
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+        # Keep bursts inside the provider quota instead of turning them into 429 retries
+        self._concurrency = threading.BoundedSemaphore(Config.API_MAX_CONCURRENCY)
+        self._breaker = CircuitBreaker(Config.CIRCUIT_BREAKER_THRESHOLD, Config.CIRCUIT_BREAKER_COOLDOWN)
+        self._rate_limiter = RateLimiter(Config.API_REQUESTS_PER_MINUTE, 60) if Config.API_REQUESTS_PER_MINUTE > 0 else None
+        # Keyed on image content, caption, prompt hash and model, so only an
+        # identical resubmission under the same prompt and model can hit
+        cache_ttl = int(Config.ANALYSIS_CACHE_TTL_HOURS * 3600)
+        self._analysis_cache = ResponseCache(Config.ANALYSIS_CACHE_PATH, cache_ttl) if Config.ANALYSIS_CACHE_PATH else None
+        # Near-duplicate photos (re-shot meal, same caption) reuse a recent analysis
+        self._semantic_cache = None
+        if Config.ANALYSIS_CACHE_PATH and Config.SEMANTIC_CACHE_MAX_DISTANCE >= 0:
+            self._semantic_cache = SemanticCache(Config.ANALYSIS_CACHE_PATH, Config.SEMANTIC_CACHE_MAX_DISTANCE, cache_ttl)
+        self._batch_queue = AsyncBatchQueue(self._analyze_batch, Config.BATCH_MAX_SIZE,
+                                            Config.BATCH_MAX_WAIT_MS / 1000)
+        # Analyses in progress, keyed like the exact cache; only touched on the event loop
+        self._inflight: Dict[bytes, "asyncio.Future"] = {}
+        self._prepared_images: "OrderedDict[bytes, str]" = OrderedDict()
+        # Optional object-store upload so photos are sent as a URL instead of inline base64
+        self._uploader = None
+        if Config.IMAGE_UPLOAD_BUCKET:
+            try:
+                self._uploader = PresignedImageUploader(
+                    Config.IMAGE_UPLOAD_BUCKET, Config.IMAGE_UPLOAD_ENDPOINT_URL, Config.IMAGE_UPLOAD_URL_TTL
+                )
+            except Exception as e:
+                logger.warning(f"Image uploads disabled, sending photos inline: {e}")
+        self._prepared_images_lock = threading.Lock()
+        # Cascade counters for logging the escalation rate; analyses run in worker threads
+        self._fast_attempts = 0
+        self._escalations = 0
+        self._cascade_lock = threading.Lock()
 
     def _get_image_hash(self, image: Image.Image) -> str:
-        """Generate a unique hash for the image including metadata"""
-        import io
-        import time
-
-        # Use original image characteristics for more unique hashing
-        img_byte_arr = io.BytesIO()
-
-        # Include original dimensions and current timestamp in hash
-        # This prevents different images from having the same hash
-        image_info = f"{image.size[0]}x{image.size[1]}_{int(time.time() * 1000)}"
-
-        # Save original image (not resized) for unique hash
-        image.save(img_byte_arr, format='JPEG', quality=95)
-        img_bytes = img_byte_arr.getvalue()
-
-        # Combine image bytes with metadata for unique hash
-        combined_data = img_bytes + image_info.encode('utf-8')
-        return hashlib.md5(combined_data).hexdigest()
-        
-    def analyze_food_image(self, image: Image.Image, caption: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Hex digest of the image's mode, size and raw pixels; identical images hash alike"""
+        return image_digest(image).hex()
+
+    def _cache_version(self) -> str:
+        """Prompt and model identity a cached analysis is only valid for"""
+        return f"{get_prompt_hash()}:{self.model}:{Config.OPENROUTER_FAST_MODEL}"
+
+    def _cache_key(self, digest: bytes, caption: Optional[str]) -> bytes:
+        """Build the analysis cache key from the pixel digest, caption and prompt/model version"""
+        return ResponseCache.make_key(digest, caption, self._cache_version())
+
+    def _lookup_cached_analysis(self, image: Image.Image, caption: Optional[str], digest: bytes,
+                                bypass_cache: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[bytes], Optional[int]]:
+        """
+        Check the exact and near-duplicate caches
+
+        Args:
+            digest: image_digest() of the image
+            bypass_cache: Skip the lookups but still return the keys, so a fresh result replaces the cached one
+
+        Returns:
+            Tuple of (cached_result, cache_key, image_phash); the keys are reused to store a fresh result
+        """
+        cache_key = None
+        if self._analysis_cache is not None:
+            cache_key = self._cache_key(digest, caption)
+            cached_result = None if bypass_cache else self._analysis_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info("Returning cached analysis for identical image and caption")
+                return cached_result, cache_key, None
+
+        image_phash = None
+        if self._semantic_cache is not None:
+            image_phash = perceptual_hash(image)
+            similar_result = None if bypass_cache else self._semantic_cache.lookup(image_phash, caption, self._cache_version())
+            if similar_result is not None:
+                logger.info("Returning cached analysis for near-identical image and caption")
+                return similar_result, cache_key, image_phash
+
+        return None, cache_key, image_phash
+
+    def _store_cached_analysis(self, analysis_result: Dict[str, Any], caption: Optional[str],
+                               cache_key: Optional[bytes], image_phash: Optional[int]):
+        """Store a finished analysis in whichever caches are enabled"""
+        if cache_key is not None:
+            self._analysis_cache.put(cache_key, analysis_result)
+        if image_phash is not None:
+            self._semantic_cache.store(image_phash, caption, self._cache_version(), analysis_result)
+
+    def _prepare_image(self, image: Image.Image, digest: Optional[bytes] = None) -> str:
+        """
+        Downscale, enhance and encode an image as base64 for analysis
+
+        Pass the image_digest() to reuse the upload of a recently prepared photo.
+        """
+        if digest is not None:
+            with self._prepared_images_lock:
+                image_base64 = self._prepared_images.get(digest)
+                if image_base64 is not None:
+                    self._prepared_images.move_to_end(digest)
+                    logger.debug("Reusing prepared image upload")
+                    return image_base64
+
+        # Vision models tile images at roughly this resolution, so larger
+        # uploads only add bytes and enhancement work
+        max_edge = Config.ANALYSIS_IMAGE_MAX_EDGE
+        if max(image.size) > max_edge:
+            image = resize_image_if_needed(image.copy(), max_size=(max_edge, max_edge))
+
+        # Enhanced image preprocessing for better AI analysis with fallback
+        try:
+            processed_image = enhance_image_for_analysis(image)
+            logger.info("Applied advanced image enhancement for optimal AI analysis")
+        except Exception as enhancement_error:
+            logger.warning(f"Image enhancement failed, using original image: {enhancement_error}")
+            # Fallback: use original image if enhancement fails
+            processed_image = image
+            if processed_image.mode != 'RGB':
+                processed_image = processed_image.convert('RGB')
+            logger.info("Using original image without enhancement as fallback")
+
+        image_base64 = pil_image_to_base64(processed_image, format=Config.ANALYSIS_IMAGE_FORMAT, quality=Config.ANALYSIS_IMAGE_QUALITY)
+        logger.debug("Image converted to base64 successfully (length: %d chars)", len(image_base64))
+
+        if digest is not None:
+            with self._prepared_images_lock:
+                self._prepared_images[digest] = image_base64
+                if len(self._prepared_images) > PREPARED_IMAGE_CACHE_SIZE:
+                    self._prepared_images.popitem(last=False)
+        return image_base64
+
+    def _upload_image(self, image_base64: str) -> Optional[str]:
+        """Presigned URL for a prepared image when uploads are configured, else None to send it inline"""
+        if self._uploader is None:
+            return None
+        try:
+            return self._uploader.upload(base64.b64decode(image_base64), self._image_mime_type())
+        except Exception as e:
+            logger.warning(f"Image upload failed, sending it inline: {e}")
+            return None
+
+    def _image_mime_type(self) -> str:
+        """MIME type of images encoded by _prepare_image"""
+        return f"image/{Config.ANALYSIS_IMAGE_FORMAT.lower()}"
+
+    def _headers(self) -> Dict[str, str]:
+        """HTTP headers for OpenRouter requests"""
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _post(self, payload: Dict[str, Any], headers: Dict[str, str], timeout: float,
+              stream: bool = False) -> requests.Response:
+        """
+        POST a chat completion, gzip-compressing the body when GZIP_REQUESTS is set
+
+        Waits for a free concurrency slot and, if configured, the per-minute rate limit.
+        """
+        with self._concurrency:
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            return self._send(payload, headers, timeout, stream)
+
+    def _send(self, payload: Dict[str, Any], headers: Dict[str, str], timeout: float,
+              stream: bool = False) -> requests.Response:
+        """Send one chat completion request over the pooled session"""
+        # Serialize with orjson when installed rather than letting requests
+        # run the stdlib encoder over the base64 image
+        body = dumps_json(payload)
+        if Config.GZIP_REQUESTS:
+            headers = {**headers, "Content-Encoding": "gzip"}
+            body = gzip.compress(body, compresslevel=Config.GZIP_LEVEL)
+
+        return self._session.post(f"{self.base_url}/chat/completions", headers=headers,
+                                  data=body, timeout=timeout, stream=stream)
+
+    def _build_payload(self, messages: List[Dict[str, Any]], schema_name: str, schema: Dict[str, Any],
+                       timestamp: int, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Build a structured-output chat completion payload"""
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": schema_name, "strict": True, "schema": schema}
+            },
+            "max_tokens": max_tokens or Config.ANALYSIS_MAX_TOKENS,
+            "temperature": 0.2,  # Slightly higher for more varied responses
+            "seed": timestamp % 10000,  # Dynamic seed based on timestamp
+            "top_p": 0.3         # Slightly higher for more creativity
+        }
+
+        # Prefer providers serving quantized weights; they prefill faster
+        if Config.OPENROUTER_QUANTIZATIONS:
+            payload["provider"] = {"quantizations": Config.OPENROUTER_QUANTIZATIONS}
+
+        return payload
+
+    def analyze_food_image(self, image: Image.Image, caption: Optional[str] = None,
+                           on_headline: Optional[Callable[[Dict[str, Any]], None]] = None,
+                           bypass_cache: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
         """
         Analyze a food image and return calorie estimation
 
         Args:
             image: PIL Image object of the food
             caption: Optional user-provided caption with additional details
+            on_headline: Called from the worker thread with the description and
+                total_calories as soon as they are streamed (STREAM_ANALYSIS only)
+            bypass_cache: Ignore cached analyses (e.g. when the user asks for a retry);
+                the fresh result still replaces the cached one
 
         Returns:
             Tuple of (analysis_result, error_message)
@@ -58,216 +336,45 @@ class VisionAnalyzer:
                 logger.error(error_msg)
                 return None, error_msg
 
-            logger.info(f"Starting food image analysis - Image size: {image.size}, Mode: {image.mode}")
+            logger.info("Starting food image analysis - Image size: %s, Mode: %s", image.size, image.mode)
 
-            # Enhanced image preprocessing for better AI analysis with fallback
-            try:
-                processed_image = enhance_image_for_analysis(image)
-                logger.info("Applied advanced image enhancement for optimal AI analysis")
-            except Exception as enhancement_error:
-                logger.warning(f"Image enhancement failed, using original image: {enhancement_error}")
-                # Fallback: use original image if enhancement fails
-                processed_image = image
-                if processed_image.mode != 'RGB':
-                    processed_image = processed_image.convert('RGB')
-                logger.info("Using original image without enhancement as fallback")
-
-            # CACHE DISABLED: Always analyze fresh to prevent showing wrong results for different photos
-            # This ensures each photo gets its own unique analysis
-            logger.info("Analyzing fresh image (cache disabled for accuracy)")
+            digest = image_digest(image)
+            cached_result, cache_key, image_phash = self._lookup_cached_analysis(image, caption, digest, bypass_cache)
+            if cached_result is not None:
+                return cached_result, None
 
             # Convert image to base64 with error handling
             try:
-                image_base64 = pil_image_to_base64(processed_image, format="JPEG")
-                logger.debug(f"Image converted to base64 successfully (length: {len(image_base64)} chars)")
+                image_base64 = self._prepare_image(image, digest)
             except Exception as base64_error:
                 error_msg = f"Failed to convert image to base64: {base64_error}"
                 logger.error(error_msg)
                 return None, error_msg
-            
-            # Prepare the enhanced prompt with caption context and randomization
-            import random
-
-            # Add randomization to prevent template responses
-            random_instruction = random.choice([
-                "🎯 ANALYZE THIS SPECIFIC IMAGE - Do not use template examples!",
-                "🔍 LOOK AT THE ACTUAL FOOD - Describe what you really see!",
-                "📸 EXAMINE THIS UNIQUE PHOTO - Give fresh analysis!",
-                "🧠 FOCUS ON THIS IMAGE - No generic responses!",
-                "👁️ STUDY THIS MEAL - Provide original analysis!"
-            ])
-
-            enhanced_prompt = f"{random_instruction}\n\n{CALORIE_ANALYSIS_PROMPT}"
-
-            if caption:
-                enhanced_prompt += f"""
-
-🚨🚨🚨 OVERRIDE ALL VISUAL ANALYSIS - USER KNOWS BEST 🚨🚨🚨
-The user explicitly stated: "{caption}"
-
-🔒 LOCKED-IN FOOD IDENTIFICATION:
-- FOOD TYPE: Extract the exact food name from user's caption
-- QUANTITY: Use user's specified amount
-- MODIFICATIONS: Honor all user specifications
-
-⚠️ CRITICAL RULES - NO EXCEPTIONS:
-1. **NEVER CHANGE THE FOOD NAME** - If user says "mango juice", your response MUST say "mango juice"
-2. **IGNORE VISUAL CONTRADICTIONS** - Even if image looks like orange juice, it's mango juice if user says so
-3. **COPY USER'S EXACT WORDS** - Don't paraphrase or "correct" their food identification
-4. **USER IS THE EXPERT** - They know what they're eating better than any AI visual analysis
-5. **IMAGE = PORTION SIZE ONLY** - Use visual only for estimating how much, not what it is
-
-🎯 YOUR TASK: Analyze the nutritional content of "{caption}" using the image only to estimate portion size.
-
-DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
-"""
-
-            # Prepare the API request
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
 
+            image_url = self._upload_image(image_base64)
+            
             # Add unique timestamp to ensure fresh analysis
             current_timestamp = int(time.time() * 1000)
-            unique_prompt = f"{enhanced_prompt}\n\n🕐 Analysis Timestamp: {current_timestamp} (Ensure fresh analysis)"
-
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": unique_prompt
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                "max_tokens": 2500,  # Increased for more detailed analysis
-                "temperature": 0.2,  # Slightly higher for more varied responses
-                "seed": current_timestamp % 10000,  # Dynamic seed based on timestamp
-                "top_p": 0.3         # Slightly higher for more creativity
-            }
-            
-            # ULTRA-SMART: Try multiple AI models for maximum accuracy
-            models_to_try = [
-                Config.OPENROUTER_MODEL,  # Primary model
-                "google/gemini-2.5-flash-preview",  # Backup model 1
-                "anthropic/claude-3.5-sonnet",  # Backup model 2
-            ]
-
-            successful_response = None
-            final_error = None
-
-            for model_index, model in enumerate(models_to_try):
-                logger.info(f"🤖 Trying AI model {model_index + 1}/{len(models_to_try)}: {model}")
-
-                # Update payload with current model
-                current_payload = payload.copy()
-                current_payload["model"] = model
-
-                # Adjust parameters for different models
-                if "claude" in model.lower():
-                    current_payload["max_tokens"] = 3000
-                    current_payload["temperature"] = 0.0
-                elif "gemini" in model.lower():
-                    current_payload["max_tokens"] = 2500
-                    current_payload["temperature"] = 0.1
-
-                # Make API request with retry logic for each model
-                max_retries = 2  # Reduced per model, but trying multiple models
-                for attempt in range(max_retries):
-                    try:
-                        logger.debug(f"Sending request to {model} (attempt {attempt + 1}/{max_retries})")
-                        response = requests.post(
-                            f"{self.base_url}/chat/completions",
-                            headers=headers,
-                            json=current_payload,
-                            timeout=45
-                        )
-
-                        logger.debug(f"Received response with status code: {response.status_code}")
-
-                        if response.status_code == 200:
-                            successful_response = response
-                            logger.info(f"✅ Success with model: {model} on attempt {attempt + 1}")
-                            break
-                        elif response.status_code == 429:  # Rate limit
-                            if attempt < max_retries - 1:
-                                wait_time = (attempt + 1) * 2
-                                logger.warning(f"Rate limited on {model}, waiting {wait_time}s before retry {attempt + 1}")
-                                time.sleep(wait_time)
-                                continue
-                            else:
-                                error_msg = f"Model {model} rate limited after all retries"
-                                logger.error(error_msg)
-                                final_error = error_msg
-                                break
-                        elif response.status_code == 400:
-                            error_msg = f"Model {model} bad request (400): {response.text[:200]}"
-                            logger.error(error_msg)
-                            final_error = error_msg
-                            break
-                        elif response.status_code == 401:
-                            error_msg = f"Model {model} authentication failed (401) - Check API key"
-                            logger.error(error_msg)
-                            final_error = error_msg
-                            break
-                        elif response.status_code == 500:
-                            error_msg = f"Model {model} server error (500)"
-                            logger.error(error_msg)
-                            final_error = error_msg
-                            if attempt < max_retries - 1:
-                                logger.info(f"Retrying after server error...")
-                                time.sleep(2)
-                                continue
-                            break
-                        else:
-                            error_msg = f"Model {model} failed with status {response.status_code}: {response.text[:200]}"
-                            logger.warning(error_msg)
-                            final_error = error_msg
-                            break
-
-                    except requests.exceptions.Timeout:
-                        error_msg = f"Model {model} timed out on attempt {attempt + 1}"
-                        logger.warning(error_msg)
-                        final_error = error_msg
-                        if attempt < max_retries - 1:
-                            logger.info("Retrying after timeout...")
-                            time.sleep(2)
-                            continue
-                        break
-                    except requests.exceptions.ConnectionError as e:
-                        error_msg = f"Connection error with model {model}: {e}"
-                        logger.error(error_msg)
-                        final_error = error_msg
-                        if attempt < max_retries - 1:
-                            logger.info("Retrying after connection error...")
-                            time.sleep(2)
-                            continue
-                        break
-                    except requests.exceptions.RequestException as e:
-                        error_msg = f"Network error with model {model}: {e}"
-                        logger.warning(error_msg)
-                        final_error = error_msg
-                        break
 
-                # If we got a successful response, break out of model loop
-                if successful_response:
-                    break
+            headers = self._headers()
 
-                # If not the last model, wait before trying next
-                if model_index < len(models_to_try) - 1:
-                    logger.info(f"⏳ Trying next model in 1 second...")
-                    time.sleep(1)
+            # Clear photos are settled by the cheap model; unclear ones escalate
+            if Config.OPENROUTER_FAST_MODEL:
+                fast_result = self._analyze_with_fast_model(image_base64, caption, current_timestamp, headers, image_url)
+                if fast_result is not None:
+                    self._finish_analysis(fast_result, Config.OPENROUTER_FAST_MODEL, headers, caption, cache_key, image_phash)
+                    return fast_result, None
+
+            payload = self._build_payload(
+                build_calorie_messages(image_base64, caption, current_timestamp, mime_type=self._image_mime_type(),
+                                       image_url=image_url),
+                "meal_analysis", get_response_schema(Config.SHORT_JSON_KEYS), current_timestamp
+            )
+
+            if Config.STREAM_ANALYSIS or Config.STREAM_STOP_FIELD:
+                payload["stream"] = True
+
+            successful_response, successful_model, final_error = self._post_with_fallback(payload, headers)
 
             # Check if any model succeeded
             if not successful_response:
@@ -277,218 +384,34 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
 
             response = successful_response
 
-            # Parse response
-            try:
-                response_data = response.json()
-            except json.JSONDecodeError as e:
-                error_msg = f"Invalid JSON response from API: {e}"
-                logger.error(error_msg)
-                return None, error_msg
-
-            if 'choices' not in response_data or not response_data['choices']:
-                error_msg = "No response from AI model"
-                logger.error(error_msg)
-                return None, error_msg
-
-            ai_response = response_data['choices'][0]['message']['content']
+            if payload.get("stream"):
+                stop_key = self._wire_key(Config.STREAM_STOP_FIELD) if Config.STREAM_STOP_FIELD else None
+                ai_response = self._read_streamed_content(response, stop_key, on_headline)
+            else:
+                # Parse response
+                try:
+                    response_data = loads_json(response.content)
+                except json.JSONDecodeError as e:
+                    error_msg = f"Invalid JSON response from API: {e}"
+                    logger.error(error_msg)
+                    return None, error_msg
+
+                if 'choices' not in response_data or not response_data['choices']:
+                    error_msg = "No response from AI model"
+                    logger.error(error_msg)
+                    return None, error_msg
+
+                ai_response = response_data['choices'][0]['message']['content']
             
             # Try to parse JSON response with enhanced recovery
             try:
-                # Clean the response - remove markdown code blocks if present
-                cleaned_response = ai_response.strip()
-
-                # Remove various markdown code block formats
-                if cleaned_response.startswith('```json'):
-                    cleaned_response = cleaned_response[7:]
-                elif cleaned_response.startswith('```'):
-                    cleaned_response = cleaned_response[3:]
-
-                if cleaned_response.endswith('```'):
-                    cleaned_response = cleaned_response[:-3]
-
-                # Remove any leading/trailing text that's not JSON
-                json_start = cleaned_response.find('{')
-                json_end = cleaned_response.rfind('}') + 1
-
-                if json_start == -1:
-                    raise json.JSONDecodeError("No JSON object found", cleaned_response, 0)
-
-                if json_end <= json_start:
-                    # Try to complete incomplete JSON
-                    logger.warning("Incomplete JSON detected, attempting to complete it")
-                    json_str = cleaned_response[json_start:]
-
-                    # Try to fix common incomplete JSON patterns
-                    if not json_str.rstrip().endswith('}'):
-                        # Handle incomplete strings first
-                        if json_str.count('"') % 2 != 0:
-                            # Odd number of quotes means unterminated string
-                            json_str += '"'
-                            logger.info("Added closing quote for unterminated string")
-
-                        # Handle incomplete arrays
-                        open_brackets = json_str.count('[') - json_str.count(']')
-                        if open_brackets > 0:
-                            json_str += ']' * open_brackets
-                            logger.info(f"Added {open_brackets} closing brackets")
-
-                        # Handle incomplete objects
-                        open_braces = json_str.count('{') - json_str.count('}')
-                        if open_braces > 0:
-                            json_str += '}' * open_braces
-                            logger.info(f"Added {open_braces} closing braces")
-
-                    analysis_result = json.loads(json_str)
-                else:
-                    json_str = cleaned_response[json_start:json_end]
-                    analysis_result = json.loads(json_str)
-                
-                # Validate required fields
-                required_fields = ['description', 'total_calories', 'confidence']
-                for field in required_fields:
-                    if field not in analysis_result:
-                        error_msg = f"Missing required field in AI response: {field}"
-                        logger.error(error_msg)
-                        return None, error_msg
-
-                # Set default values for missing fields and enhance basic responses
-                if 'health_category' not in analysis_result:
-                    analysis_result['health_category'] = 'moderate'
-                if 'health_score' not in analysis_result:
-                    analysis_result['health_score'] = 5
-                if 'witty_comment' not in analysis_result:
-                    analysis_result['witty_comment'] = ''
-                if 'recommendations' not in analysis_result:
-                    analysis_result['recommendations'] = ''
-                if 'fun_fact' not in analysis_result:
-                    analysis_result['fun_fact'] = ''
-                if 'total_carbs' not in analysis_result:
-                    analysis_result['total_carbs'] = 0
-                if 'total_protein' not in analysis_result:
-                    analysis_result['total_protein'] = 0
-                if 'total_fat' not in analysis_result:
-                    analysis_result['total_fat'] = 0
-
-                # Enhance basic responses with estimated detailed breakdown
-                if 'food_items' not in analysis_result or not analysis_result['food_items']:
-                    # Create food items from description if missing
-                    description = analysis_result.get('description', 'Food item')
-                    total_calories = analysis_result.get('total_calories', 0)
-
-                    # Split description into food items
-                    food_names = [item.strip() for item in description.split(',')]
-                    if len(food_names) == 1 and ',' not in description:
-                        # Single item, use full calories
-                        food_items = [{
-                            "name": food_names[0],
-                            "portion": "estimated portion",
-                            "calories": total_calories,
-                            "carbs": total_calories * 0.5 / 4,  # Rough estimate: 50% carbs
-                            "protein": total_calories * 0.2 / 4,  # 20% protein
-                            "fat": total_calories * 0.3 / 9,     # 30% fat
-                            "cooking_method": "prepared",
-                            "health_score": analysis_result.get('health_score', 5)
-                        }]
-                    else:
-                        # Multiple items, distribute calories
-                        calories_per_item = total_calories / len(food_names) if food_names else total_calories
-                        food_items = []
-                        for name in food_names:
-                            food_items.append({
-                                "name": name,
-                                "portion": "estimated portion",
-                                "calories": calories_per_item,
-                                "carbs": calories_per_item * 0.5 / 4,
-                                "protein": calories_per_item * 0.2 / 4,
-                                "fat": calories_per_item * 0.3 / 9,
-                                "cooking_method": "prepared",
-                                "health_score": analysis_result.get('health_score', 5)
-                            })
-
-                    analysis_result['food_items'] = food_items
-                    logger.info("Enhanced basic response with estimated food breakdown")
-
-                # Add estimated macronutrients if missing
-                if analysis_result.get('total_carbs', 0) == 0 and analysis_result.get('total_calories', 0) > 0:
-                    total_cal = analysis_result['total_calories']
-                    analysis_result['total_carbs'] = total_cal * 0.5 / 4  # 50% carbs
-                    analysis_result['total_protein'] = total_cal * 0.2 / 4  # 20% protein
-                    analysis_result['total_fat'] = total_cal * 0.3 / 9     # 30% fat
-                    logger.info("Added estimated macronutrient breakdown")
-
-                # Add contextual content if missing
-                if not analysis_result.get('witty_comment'):
-                    calories = analysis_result.get('total_calories', 0)
-                    health_category = analysis_result.get('health_category', 'moderate')
-
-                    if health_category == 'junk' or calories > 800:
-                        analysis_result['witty_comment'] = "That's quite a calorie-dense choice! Your future self might have some words about this decision."
-                    elif health_category == 'healthy' or calories < 300:
-                        analysis_result['witty_comment'] = "Great choice! Your body will thank you for this nutritious fuel."
-                    else:
-                        analysis_result['witty_comment'] = "A balanced meal that fits well into a healthy eating pattern."
-
-                if not analysis_result.get('recommendations'):
-                    health_category = analysis_result.get('health_category', 'moderate')
-
-                    if health_category == 'junk':
-                        analysis_result['recommendations'] = "Consider balancing this with extra vegetables and water. Maybe plan a lighter next meal?"
-                    elif health_category == 'healthy':
-                        analysis_result['recommendations'] = "Keep up the great choices! This meal provides good nutrition and energy."
-                    else:
-                        analysis_result['recommendations'] = "Try adding more vegetables or lean protein to boost the nutritional value."
-
-                if not analysis_result.get('fun_fact'):
-                    analysis_result['fun_fact'] = "Did you know? It takes about 20 minutes for your brain to register that you're full, so eating slowly can help with portion control!"
-                
-                # Ensure numeric fields are properly typed with robust parsing
-                analysis_result['total_calories'] = parse_numeric_value(analysis_result['total_calories'], 0.0)
-                analysis_result['confidence'] = parse_numeric_value(analysis_result['confidence'], 70.0)
-
-                # Parse numeric fields in food_items if they exist
-                if 'food_items' in analysis_result and analysis_result['food_items']:
-                    for item in analysis_result['food_items']:
-                        if 'calories' in item:
-                            item['calories'] = parse_numeric_value(item.get('calories', 0), 0.0)
-                        if 'carbs' in item:
-                            item['carbs'] = parse_numeric_value(item.get('carbs', 0), 0.0)
-                        if 'protein' in item:
-                            item['protein'] = parse_numeric_value(item.get('protein', 0), 0.0)
-                        if 'fat' in item:
-                            item['fat'] = parse_numeric_value(item.get('fat', 0), 0.0)
-                        if 'health_score' in item:
-                            item['health_score'] = parse_numeric_value(item.get('health_score', 5), 5.0)
-
-                # Parse total macronutrients
-                if 'total_carbs' in analysis_result:
-                    analysis_result['total_carbs'] = parse_numeric_value(analysis_result.get('total_carbs', 0), 0.0)
-                if 'total_protein' in analysis_result:
-                    analysis_result['total_protein'] = parse_numeric_value(analysis_result.get('total_protein', 0), 0.0)
-                if 'total_fat' in analysis_result:
-                    analysis_result['total_fat'] = parse_numeric_value(analysis_result.get('total_fat', 0), 0.0)
-                if 'health_score' in analysis_result:
-                    analysis_result['health_score'] = parse_numeric_value(analysis_result.get('health_score', 5), 5.0)
-                
-                # Validate ranges
-                if analysis_result['confidence'] < 0 or analysis_result['confidence'] > 100:
-                    analysis_result['confidence'] = max(0, min(100, analysis_result['confidence']))
-                
-                if analysis_result['total_calories'] < 0:
-                    analysis_result['total_calories'] = 0
-                
-                # Cache disabled - each photo gets fresh analysis for accuracy
+                analysis_result = expand_keys(self._extract_json(ai_response))
 
-                # Debug logging to see what fields we actually got
-                available_fields = list(analysis_result.keys())
-                logger.info(f"Successfully analyzed food image: {analysis_result['description']} "
-                           f"({analysis_result['total_calories']} cal, {analysis_result['confidence']}% confidence)")
-                logger.debug(f"Analysis result fields: {available_fields}")
-
-                # Check if we have detailed fields
-                has_detailed_fields = any(field in analysis_result for field in ['food_items', 'witty_comment', 'recommendations', 'total_carbs'])
-                if not has_detailed_fields:
-                    logger.warning("AI response missing detailed fields - may show basic format only")
+                error_msg = self._complete_analysis(analysis_result)
+                if error_msg:
+                    return None, error_msg
 
+                self._finish_analysis(analysis_result, successful_model, headers, caption, cache_key, image_phash)
                 return analysis_result, None
                 
             except json.JSONDecodeError as e:
@@ -499,45 +422,16 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
                     # Try multiple recovery strategies
                     analysis_result = None
 
-                    # Strategy 1: Extract from partial JSON using regex
-                    if '"description"' in ai_response and '"total_calories"' in ai_response:
-                        import re
-
-                        # Extract description
-                        desc_match = re.search(r'"description":\s*"([^"]*)"', ai_response)
-                        description = desc_match.group(1) if desc_match else "Food item"
-
-                        # Extract total calories (handle both integer and float)
-                        cal_match = re.search(r'"total_calories":\s*(\d+(?:\.\d+)?)', ai_response)
-                        total_calories = float(cal_match.group(1)) if cal_match else 150
-
-                        # Extract confidence
-                        conf_match = re.search(r'"confidence":\s*(\d+(?:\.\d+)?)', ai_response)
-                        confidence = float(conf_match.group(1)) if conf_match else 70
-
-                        # Try to extract food items
-                        food_items = []
-                        food_items_match = re.search(r'"food_items":\s*\[(.*?)\]', ai_response, re.DOTALL)
-                        if food_items_match:
-                            items_text = food_items_match.group(1)
-                            # Extract individual food items
-                            item_matches = re.finditer(r'\{[^}]*"name":\s*"([^"]*)"[^}]*"calories":\s*(\d+(?:\.\d+)?)[^}]*\}', items_text)
-                            for item_match in item_matches:
-                                food_items.append({
-                                    "name": item_match.group(1),
-                                    "calories": float(item_match.group(2)),
-                                    "portion": "estimated portion"
-                                })
-
-                        analysis_result = {
-                            "description": description,
-                            "total_calories": total_calories,
-                            "confidence": confidence,
-                            "food_items": food_items,
-                            "notes": "Analysis recovered from partial response"
-                        }
-
-                        logger.info(f"Successfully recovered analysis from partial JSON: {description}")
+                    # Strategy 1: Close the truncated JSON after its last complete value
+                    json_start = ai_response.find('{')
+                    if json_start != -1:
+                        partial = expand_keys(loads_json(self._close_truncated_json(ai_response[json_start:])))
+                        if isinstance(partial, dict) and 'description' in partial and 'total_calories' in partial:
+                            partial.setdefault('confidence', 70)
+                            partial['notes'] = "Analysis recovered from partial response"
+                            if self._complete_analysis(partial) is None:
+                                analysis_result = partial
+                                logger.info(f"Successfully recovered analysis from partial JSON: {partial['description']}")
 
                     # Strategy 2: Create minimal fallback response
                     if not analysis_result:
@@ -585,6 +479,668 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
             logger.error(error_msg)
             return None, error_msg
     
+    def _post_with_fallback(self, payload: Dict[str, Any], headers: Dict[str, str],
+                            models: Optional[List[str]] = None) -> Tuple[Optional[requests.Response], Optional[str], Optional[str]]:
+        """
+        Send a chat completion, retrying and falling back across models
+
+        Args:
+            models: Models to try in order; defaults to the primary model and its backups
+
+        Returns:
+            Tuple of (response, model, last_error); response is None if every model failed
+
+        After CIRCUIT_BREAKER_THRESHOLD consecutive calls fail with transient
+        errors, calls fail immediately for CIRCUIT_BREAKER_COOLDOWN seconds.
+        """
+        if self._breaker.is_open():
+            return None, None, "AI service temporarily unavailable"
+
+        # ULTRA-SMART: Try multiple AI models for maximum accuracy
+        models_to_try = models or [
+            Config.OPENROUTER_MODEL,  # Primary model
+            "google/gemini-2.5-flash-preview",  # Backup model 1
+            "anthropic/claude-3.5-sonnet",  # Backup model 2
+        ]
+
+        successful_response = None
+        successful_model = None
+        final_error = None
+        # Whether any model failed like an outage rather than a bad request
+        transient_failure = False
+
+        for model_index, model in enumerate(models_to_try):
+            logger.info("🤖 Trying AI model %d/%d: %s", model_index + 1, len(models_to_try), model)
+
+            # Update payload with current model
+            current_payload = payload.copy()
+            current_payload["model"] = model
+
+            model_headers = headers
+
+            # Adjust parameters for different models
+            if "claude" in model.lower():
+                current_payload["temperature"] = 0.0
+                # Let Anthropic honor the cache_control breakpoint on the system prompt
+                model_headers = {**headers, **ANTHROPIC_CACHE_HEADERS}
+            elif "gemini" in model.lower():
+                current_payload["temperature"] = 0.1
+
+            # Thinking variants spend part of max_tokens reasoning before the JSON
+            if model.endswith(":thinking"):
+                current_payload["max_tokens"] = max(payload["max_tokens"], THINKING_MIN_MAX_TOKENS)
+
+            # Make API request with retry logic for each model
+            max_retries = MAX_ATTEMPTS_PER_MODEL
+            for attempt in range(max_retries):
+                try:
+                    logger.debug("Sending request to %s (attempt %d/%d)", model, attempt + 1, max_retries)
+                    response = self._post(current_payload, model_headers, timeout=45,
+                                          stream=current_payload.get("stream", False))
+
+                    logger.debug("Received response with status code: %s", response.status_code)
+
+                    if response.status_code == 200:
+                        successful_response = response
+                        successful_model = model
+                        logger.info("✅ Success with model: %s on attempt %d", model, attempt + 1)
+                        break
+                    elif response.status_code in RETRYABLE_STATUS_CODES:  # Rate limit or transient server error
+                        error_msg = f"Model {model} returned transient status {response.status_code}"
+                        final_error = error_msg
+                        # Release the pooled connection before sleeping or moving on
+                        response.close()
+                        transient_failure = True
+                        if attempt < max_retries - 1:
+                            wait_time = self._retry_delay(attempt, response)
+                            logger.warning(f"{error_msg}, waiting {wait_time:.1f}s before retry {attempt + 1}")
+                            time.sleep(wait_time)
+                            continue
+                        logger.error(f"{error_msg} after all retries")
+                        break
+                    elif response.status_code == 400:
+                        error_msg = f"Model {model} bad request (400): {response.text[:200]}"
+                        response.close()
+                        logger.error(error_msg)
+                        final_error = error_msg
+                        break
+                    elif response.status_code == 401:
+                        error_msg = f"Model {model} authentication failed (401) - Check API key"
+                        response.close()
+                        logger.error(error_msg)
+                        final_error = error_msg
+                        break
+                    else:
+                        error_msg = f"Model {model} failed with status {response.status_code}: {response.text[:200]}"
+                        response.close()
+                        logger.warning(error_msg)
+                        final_error = error_msg
+                        break
+
+                except requests.exceptions.Timeout:
+                    error_msg = f"Model {model} timed out on attempt {attempt + 1}"
+                    logger.warning(error_msg)
+                    final_error = error_msg
+                    transient_failure = True
+                    if attempt < max_retries - 1:
+                        logger.info("Retrying after timeout...")
+                        time.sleep(self._retry_delay(attempt))
+                        continue
+                    break
+                except requests.exceptions.ConnectionError as e:
+                    error_msg = f"Connection error with model {model}: {e}"
+                    logger.error(error_msg)
+                    final_error = error_msg
+                    transient_failure = True
+                    if attempt < max_retries - 1:
+                        logger.info("Retrying after connection error...")
+                        time.sleep(self._retry_delay(attempt))
+                        continue
+                    break
+                except requests.exceptions.RequestException as e:
+                    error_msg = f"Network error with model {model}: {e}"
+                    logger.warning(error_msg)
+                    final_error = error_msg
+                    break
+
+            # If we got a successful response, break out of model loop
+            if successful_response:
+                break
+
+            # If not the last model, wait before trying next
+            if model_index < len(models_to_try) - 1:
+                logger.info("⏳ Trying next model in 1 second...")
+                time.sleep(1)
+
+        if successful_response:
+            self._breaker.record_success()
+        elif transient_failure:
+            self._breaker.record_failure()
+
+        return successful_response, successful_model, final_error
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        Seconds to wait before retrying after the given zero-based attempt
+
+        Honors a numeric Retry-After header (capped), else backs off
+        exponentially with full jitter so concurrent callers spread out.
+        """
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), RETRY_MAX_DELAY)
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY))
+
+    @staticmethod
+    def _wire_key(field: str) -> str:
+        """Name a response field is streamed under"""
+        return SHORT_KEYS.get(field, field) if Config.SHORT_JSON_KEYS else field
+
+    def _read_streamed_content(self, response: requests.Response, stop_key: Optional[str] = None,
+                               on_headline: Optional[Callable[[Dict[str, Any]], None]] = None) -> str:
+        """
+        Accumulate a streamed completion
+
+        Once the total_calories value is closed by its delimiter, it and the
+        fields before it are handed to on_headline. If stop_key is given, the
+        connection is closed as soon as that field starts; closing the stream
+        makes the provider stop generating, so trailing fields the bot never
+        shows are not paid for. The returned JSON is then closed just before
+        the stop key.
+        """
+        headline_key = self._wire_key('total_calories') if on_headline is not None else None
+
+        content = ""
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Skip keep-alive comments and blank separators
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+
+                choices = loads_json(data).get("choices") or []
+                if not choices:
+                    continue
+                search_from = len(content)
+                content += choices[0].get("delta", {}).get("content") or ""
+
+                if headline_key is not None:
+                    offset = self._find_scalar_value_end(content, headline_key, search_from)
+                    if offset is not None:
+                        headline_key = None
+                        self._emit_headline(content[:offset] + "}", on_headline)
+
+                if stop_key is not None:
+                    offset = self._find_top_level_key(content, stop_key, search_from)
+                    if offset is not None:
+                        logger.debug("Stopping stream before '%s' after %d chars", stop_key, len(content))
+                        return content[:offset] + "}"
+        finally:
+            response.close()
+
+        return content
+
+    def _find_top_level_key(self, content: str, key: str, search_from: int) -> Optional[int]:
+        """Offset of the comma opening top-level key in a JSON prefix, or None if not streamed yet"""
+        # Back up far enough to catch a key split across chunks
+        for match in _top_level_key_pattern(key).finditer(content, max(0, search_from - len(key) - 8)):
+            if self._json_depth(content[:match.start()]) == 1:
+                return match.start()
+        return None
+
+    def _find_scalar_value_end(self, content: str, key: str, search_from: int) -> Optional[int]:
+        """Offset just past the complete value of top-level key in a JSON prefix, or None if not streamed yet"""
+        # Scalars are short, so backing up a little catches a key and value split across chunks
+        for match in _scalar_value_pattern(key).finditer(content, max(0, search_from - len(key) - 32)):
+            if self._json_depth(content[:match.start(1)]) == 1:
+                return match.end(1)
+        return None
+
+    def _emit_headline(self, partial_json: str, on_headline: Callable[[Dict[str, Any]], None]):
+        """Parse the completed leading fields and pass them on; failures never affect the analysis"""
+        try:
+            headline = expand_keys(self._extract_json(partial_json))
+            on_headline({field: headline.get(field) for field in ('description', 'total_calories')})
+        except Exception as e:
+            logger.warning(f"Could not deliver streamed headline: {e}")
+
+    @staticmethod
+    def _close_truncated_json(text: str) -> str:
+        """
+        Cut a truncated JSON document back to its last complete value and close it
+
+        A single pass tracks strings and open brackets, remembering the last
+        point where the document could be closed: after an opening bracket, a
+        closing bracket, or just before a comma. Partial keys and values after
+        that point are dropped.
+        """
+        stack = []
+        in_string = escaped = False
+        cut, cut_stack = 0, []
+        for index, char in enumerate(text):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                stack.append("}" if char == "{" else "]")
+                cut, cut_stack = index + 1, stack.copy()
+            elif char in "}]":
+                if stack:
+                    stack.pop()
+                cut, cut_stack = index + 1, stack.copy()
+                if not stack:
+                    return text[:cut]
+            elif char == ",":
+                cut, cut_stack = index, stack.copy()
+        return text[:cut] + "".join(reversed(cut_stack))
+
+    @staticmethod
+    def _json_depth(text: str) -> int:
+        """Object/array nesting depth at the end of a JSON prefix, ignoring brackets inside strings"""
+        depth = 0
+        in_string = escaped = False
+        for char in text:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in "{[":
+                depth += 1
+            elif char in "}]":
+                depth -= 1
+        return depth
+
+    def _finish_analysis(self, analysis_result: Dict[str, Any], model: str, headers: Dict[str, str],
+                         caption: Optional[str], cache_key: Optional[bytes], image_phash: Optional[int]):
+        """Add the junk food reality check and cache a completed analysis"""
+        # Junk food gets its reality check from a second, text-only call
+        if analysis_result.get('health_category') == 'junk':
+            self._add_reality_check(analysis_result, model, headers)
+
+        self._store_cached_analysis(analysis_result, caption, cache_key, image_phash)
+
+    def _analyze_with_fast_model(self, image_base64: str, caption: Optional[str], timestamp: int,
+                                 headers: Dict[str, str], image_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        First pass of the model cascade: the cheap model with the short prompt
+
+        Returns:
+            The completed analysis if the cheap model is confident enough, else None to escalate
+        """
+        with self._cascade_lock:
+            self._fast_attempts += 1
+        try:
+            payload = self._build_payload(
+                build_calorie_messages(image_base64, caption, timestamp, fast=True, mime_type=self._image_mime_type(),
+                                       image_url=image_url),
+                "meal_analysis", get_response_schema(Config.SHORT_JSON_KEYS), timestamp
+            )
+            response, _, final_error = self._post_with_fallback(payload, headers, [Config.OPENROUTER_FAST_MODEL])
+            if response is not None:
+                ai_response = loads_json(response.content)['choices'][0]['message']['content']
+                analysis_result = expand_keys(self._extract_json(ai_response))
+                if (self._complete_analysis(analysis_result) is None
+                        and analysis_result['confidence'] >= Config.CASCADE_MIN_CONFIDENCE):
+                    logger.info("Fast model settled analysis at %.0f%% confidence", analysis_result['confidence'])
+                    return analysis_result
+            else:
+                logger.warning(f"Fast model failed: {final_error}")
+        except Exception as e:
+            logger.warning(f"Fast model analysis failed, escalating: {e}")
+
+        with self._cascade_lock:
+            self._escalations += 1
+            escalations, attempts = self._escalations, self._fast_attempts
+        logger.info("Escalating to the full model (%d/%d = %.0f%% escalation rate)",
+                    escalations, attempts, 100 * escalations / attempts)
+        return None
+
+    def _extract_json(self, ai_response: str) -> Any:
+        """Parse the model's JSON reply, stripping markdown fences and closing truncated output"""
+        try:
+            # Structured output returns bare JSON; both parsers skip surrounding
+            # whitespace, so parse it without copying or stripping it first
+            parsed = loads_json(ai_response)
+            if isinstance(parsed, dict):
+                return parsed
+        except json.JSONDecodeError:
+            pass
+
+        # Clean the response - remove markdown code blocks if present
+        cleaned_response = ai_response.strip().removeprefix('```json').removeprefix('```').removesuffix('```')
+
+        # Remove any leading/trailing text that's not JSON
+        json_start = cleaned_response.find('{')
+        json_end = cleaned_response.rfind('}') + 1
+
+        if json_start == -1:
+            raise json.JSONDecodeError("No JSON object found", cleaned_response, 0)
+
+        if json_end <= json_start:
+            # Try to complete incomplete JSON
+            logger.warning("Incomplete JSON detected, attempting to complete it")
+            json_str = cleaned_response[json_start:]
+
+            # Try to fix common incomplete JSON patterns
+            if not json_str.rstrip().endswith('}'):
+                # Handle incomplete strings first
+                if json_str.count('"') % 2 != 0:
+                    # Odd number of quotes means unterminated string
+                    json_str += '"'
+                    logger.info("Added closing quote for unterminated string")
+
+                # Handle incomplete arrays
+                open_brackets = json_str.count('[') - json_str.count(']')
+                if open_brackets > 0:
+                    json_str += ']' * open_brackets
+                    logger.info(f"Added {open_brackets} closing brackets")
+
+                # Handle incomplete objects
+                open_braces = json_str.count('{') - json_str.count('}')
+                if open_braces > 0:
+                    json_str += '}' * open_braces
+                    logger.info(f"Added {open_braces} closing braces")
+
+            return loads_json(json_str)
+        else:
+            json_str = cleaned_response[json_start:json_end]
+            return loads_json(json_str)
+
+    def _complete_analysis(self, analysis_result: Dict[str, Any]) -> Optional[str]:
+        """
+        Validate a parsed analysis in place, filling defaults and normalizing numbers
+
+        Returns:
+            Error message if a required field is missing, else None
+        """
+        # Validate required fields
+        for field in REQUIRED_ANALYSIS_FIELDS:
+            if field not in analysis_result:
+                error_msg = f"Missing required field in AI response: {field}"
+                logger.error(error_msg)
+                return error_msg
+
+        # The schema asks for the category as an index; map it back to its name
+        category = analysis_result.get('health_category')
+        if isinstance(category, (int, float)) and not isinstance(category, bool):
+            index = int(category)
+            analysis_result['health_category'] = HEALTH_CATEGORIES[index] if 0 <= index < len(HEALTH_CATEGORIES) else 'moderate'
+
+        # Set default values for missing fields and enhance basic responses
+        for field, default in ANALYSIS_DEFAULTS.items():
+            analysis_result.setdefault(field, default)
+
+        # Enhance basic responses with estimated detailed breakdown
+        if 'food_items' not in analysis_result or not analysis_result['food_items']:
+            # Create food items from description if missing
+            description = analysis_result.get('description', 'Food item')
+            total_calories = analysis_result.get('total_calories', 0)
+
+            # Split description into food items
+            food_names = [item.strip() for item in description.split(',')]
+            if len(food_names) == 1 and ',' not in description:
+                # Single item, use full calories
+                food_items = [{
+                    "name": food_names[0],
+                    "portion": "estimated portion",
+                    "calories": total_calories,
+                    "carbs": total_calories * 0.5 / 4,  # Rough estimate: 50% carbs
+                    "protein": total_calories * 0.2 / 4,  # 20% protein
+                    "fat": total_calories * 0.3 / 9,     # 30% fat
+                    "cooking_method": "prepared",
+                    "health_score": analysis_result.get('health_score', 5)
+                }]
+            else:
+                # Multiple items, distribute calories
+                calories_per_item = total_calories / len(food_names) if food_names else total_calories
+                food_items = []
+                for name in food_names:
+                    food_items.append({
+                        "name": name,
+                        "portion": "estimated portion",
+                        "calories": calories_per_item,
+                        "carbs": calories_per_item * 0.5 / 4,
+                        "protein": calories_per_item * 0.2 / 4,
+                        "fat": calories_per_item * 0.3 / 9,
+                        "cooking_method": "prepared",
+                        "health_score": analysis_result.get('health_score', 5)
+                    })
+
+            analysis_result['food_items'] = food_items
+            logger.info("Enhanced basic response with estimated food breakdown")
+
+        # Add estimated macronutrients if missing
+        if analysis_result.get('total_carbs', 0) == 0 and analysis_result.get('total_calories', 0) > 0:
+            total_cal = analysis_result['total_calories']
+            analysis_result['total_carbs'] = total_cal * 0.5 / 4  # 50% carbs
+            analysis_result['total_protein'] = total_cal * 0.2 / 4  # 20% protein
+            analysis_result['total_fat'] = total_cal * 0.3 / 9     # 30% fat
+            logger.info("Added estimated macronutrient breakdown")
+
+        # Add contextual content if missing
+        if not analysis_result.get('witty_comment'):
+            calories = analysis_result.get('total_calories', 0)
+            health_category = analysis_result.get('health_category', 'moderate')
+
+            if health_category == 'junk' or calories > 800:
+                analysis_result['witty_comment'] = "That's quite a calorie-dense choice! Your future self might have some words about this decision."
+            elif health_category == 'healthy' or calories < 300:
+                analysis_result['witty_comment'] = "Great choice! Your body will thank you for this nutritious fuel."
+            else:
+                analysis_result['witty_comment'] = "A balanced meal that fits well into a healthy eating pattern."
+
+        if not analysis_result.get('recommendations'):
+            health_category = analysis_result.get('health_category', 'moderate')
+
+            if health_category == 'junk':
+                analysis_result['recommendations'] = "Consider balancing this with extra vegetables and water. Maybe plan a lighter next meal?"
+            elif health_category == 'healthy':
+                analysis_result['recommendations'] = "Keep up the great choices! This meal provides good nutrition and energy."
+            else:
+                analysis_result['recommendations'] = "Try adding more vegetables or lean protein to boost the nutritional value."
+
+        if not analysis_result.get('fun_fact'):
+            analysis_result['fun_fact'] = "Did you know? It takes about 20 minutes for your brain to register that you're full, so eating slowly can help with portion control!"
+
+        # Parse every numeric field robustly and clamp it to its valid range
+        _normalize_numbers(analysis_result, ANALYSIS_NUMBER_RANGES)
+        for item in analysis_result['food_items']:
+            _normalize_numbers(item, FOOD_ITEM_NUMBER_RANGES)
+
+        # Debug logging to see what fields we actually got; %-style so the
+        # messages are only formatted when the level is enabled
+        logger.info("Successfully analyzed food image: %s (%s cal, %s%% confidence)",
+                    analysis_result['description'], analysis_result['total_calories'], analysis_result['confidence'])
+        logger.debug("Analysis result fields: %s", analysis_result.keys())
+
+        # Check if we have detailed fields
+        has_detailed_fields = any(field in analysis_result for field in ['food_items', 'witty_comment', 'recommendations', 'total_carbs'])
+        if not has_detailed_fields:
+            logger.warning("AI response missing detailed fields - may show basic format only")
+
+        return None
+
+    async def analyze_food_image_async(self, image: Image.Image, caption: Optional[str] = None,
+                                       on_headline: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Analyze a food image without blocking the event loop
+
+        Concurrent calls are coalesced into batches, and a photo and caption
+        already being analyzed share that analysis; see analyze_food_image for
+        the arguments and result format. on_headline is only called for photos
+        analyzed on their own, and not for callers joining an analysis.
+        """
+        key = self._cache_key(await asyncio.to_thread(image_digest, image), caption)
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._batch_queue.submit((image, caption, on_headline)))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Joining in-flight analysis of an identical photo")
+
+        # Shielded so one caller giving up does not cancel the analysis for the rest
+        analysis_result, error = await asyncio.shield(pending)
+        # Callers edit their result (reality check, formatting); give each its own copy
+        return copy.deepcopy(analysis_result), error
+
+    async def _analyze_batch(self, batch):
+        """
+        Analyze a batch of (image, caption, on_headline) requests
+
+        Several photos go out as one multi-image request; if that fails, each
+        photo is analyzed on its own, concurrently in worker threads. While the
+        model cascade is enabled photos are always analyzed on their own, so
+        each one still gets the cheap first pass.
+        """
+        if len(batch) > 1 and Config.MULTI_IMAGE_BATCHING and not Config.OPENROUTER_FAST_MODEL:
+            results = await asyncio.to_thread(self._analyze_images_together, batch)
+            if results is not None:
+                return results
+
+        return await asyncio.gather(*(
+            asyncio.to_thread(self.analyze_food_image, image, caption, on_headline)
+            for image, caption, on_headline in batch
+        ))
+
+    def _analyze_images_together(self, batch) -> Optional[List[Tuple[Optional[Dict[str, Any]], Optional[str]]]]:
+        """
+        Analyze several photos in a single multi-image request
+
+        Cached photos are answered from the cache and only the rest are sent.
+
+        Returns:
+            One (analysis_result, error_message) per item, or None if the combined
+            request failed and the caller should fall back to per-photo requests
+        """
+        try:
+            results = [None] * len(batch)
+            pending = []
+            for index, (image, caption, _) in enumerate(batch):
+                if image is None:
+                    results[index] = (None, "Received None image for analysis")
+                    continue
+                digest = image_digest(image)
+                cached_result, cache_key, image_phash = self._lookup_cached_analysis(image, caption, digest)
+                if cached_result is not None:
+                    results[index] = (cached_result, None)
+                else:
+                    pending.append((index, caption, cache_key, image_phash, self._prepare_image(image, digest)))
+
+            if len(pending) == 1:
+                index, caption = pending[0][0], pending[0][1]
+                results[index] = self.analyze_food_image(batch[index][0], caption, batch[index][2])
+            elif pending:
+                current_timestamp = int(time.time() * 1000)
+                payload = self._build_payload(
+                    build_batch_calorie_messages(
+                        [(image_base64, caption, self._upload_image(image_base64))
+                         for _, caption, _, _, image_base64 in pending],
+                        current_timestamp, mime_type=self._image_mime_type()
+                    ),
+                    "meal_analyses", get_response_schema(Config.SHORT_JSON_KEYS, batch=True), current_timestamp,
+                    max_tokens=Config.ANALYSIS_MAX_TOKENS * len(pending)
+                )
+                headers = self._headers()
+
+                response, model, final_error = self._post_with_fallback(payload, headers)
+                if not response:
+                    logger.warning(f"Multi-image request failed: {final_error}")
+                    return None
+
+                ai_response = loads_json(response.content)['choices'][0]['message']['content']
+                analyses = expand_keys(self._extract_json(ai_response)).get('analyses')
+                if not isinstance(analyses, list) or len(analyses) != len(pending):
+                    logger.warning("Multi-image response did not contain one analysis per photo")
+                    return None
+
+                for (index, caption, cache_key, image_phash, _), analysis_result in zip(pending, analyses):
+                    error_msg = self._complete_analysis(analysis_result)
+                    if error_msg:
+                        results[index] = (None, error_msg)
+                        continue
+                    self._finish_analysis(analysis_result, model, headers, caption, cache_key, image_phash)
+                    results[index] = (analysis_result, None)
+
+                logger.info("Analyzed %d photos in one request", len(pending))
+
+            return results
+
+        except Exception as e:
+            logger.warning(f"Multi-image analysis failed, falling back to per-photo requests: {e}")
+            return None
+
+    def _add_reality_check(self, analysis_result: Dict[str, Any], model: str, headers: Dict[str, str]) -> None:
+        """
+        Rewrite witty_comment and recommendations for a junk food analysis
+
+        Keeps the first-pass values if the follow-up request fails for any reason.
+        """
+        meal_summary = {
+            field: analysis_result.get(field)
+            for field in ['description', 'food_items', 'total_calories', 'health_score', 'user_input_acknowledged']
+        }
+
+        payload = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": get_junk_food_addendum(),
+                            "cache_control": {"type": "ephemeral"}
+                        }
+                    ]
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(meal_summary)
+                }
+            ],
+            "response_format": {
+                "type": "json_schema",
+                "json_schema": {"name": "reality_check", "strict": True, "schema": REALITY_CHECK_JSON_SCHEMA}
+            },
+            "max_tokens": 400,
+            "temperature": 0.2
+        }
+
+        try:
+            response = self._post(payload, headers, timeout=30)
+            if response.status_code != 200:
+                logger.warning(f"Reality check request failed with status {response.status_code}")
+                return
+
+            content = loads_json(response.content)['choices'][0]['message']['content']
+            reality_check = self._extract_json(content)
+
+            for field in ['witty_comment', 'recommendations']:
+                if reality_check.get(field):
+                    analysis_result[field] = reality_check[field]
+            logger.info("Added junk food reality check")
+
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            logger.warning(f"Reality check failed, keeping first-pass comments: {e}")
+
     def format_analysis_for_user(self, analysis: Dict[str, Any]) -> str:
         """Format enhanced analysis result for user display with safe markdown"""
         try:
@@ -607,53 +1163,53 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
             health_emoji = health_emojis.get(health_category, '🍽️')
             health_score = analysis.get('health_score', 5)
 
-            # Build message with enhanced formatting
-            message = ""
+            # Build message with enhanced formatting; parts are joined once at the end
+            parts = []
 
             # Add user input acknowledgment if provided
             if analysis.get('user_input_acknowledged'):
                 user_ack = safe_escape(analysis['user_input_acknowledged'])
-                message += f"✅ *Analyzing your:* {user_ack}\n\n"
+                parts.append(f"✅ *Analyzing your:* {user_ack}\n\n")
 
-            message += f"{health_emoji} *{description}*\n\n"
+            parts.append(f"{health_emoji} *{description}*\n\n")
 
             # Add special warning banner for junk food
             if health_category == 'junk':
-                message += "🚨 *WARNING: HIGH-RISK FOOD DETECTED* 🚨\n"
-                message += "⚠️ *This meal may significantly impact your health* ⚠️\n\n"
+                parts.append("🚨 *WARNING: HIGH-RISK FOOD DETECTED* 🚨\n")
+                parts.append("⚠️ *This meal may significantly impact your health* ⚠️\n\n")
 
             # Calories and health score with enhanced impact for junk food
-            message += f"🔥 *Calories:* {analysis['total_calories']:.0f}\n"
+            parts.append(f"🔥 *Calories:* {analysis['total_calories']:.0f}\n")
 
             # Enhanced health score display based on category
-            health_score_int = int(health_score)  # Convert to int for emoji multiplication
+            health_score_int = max(0, int(health_score))  # Index into the indicator tables
             if health_category == 'junk':
                 if health_score <= 3:
-                    health_display = f"💀 *Health Score:* {health_score}/10 {'💀' * min(health_score_int, 3)} - DANGER ZONE"
+                    health_display = f"💀 *Health Score:* {health_score}/10 {SCORE_SKULLS[min(health_score_int, 3)]} - DANGER ZONE"
                 else:
-                    health_display = f"⚠️ *Health Score:* {health_score}/10 {'⚠️' * min(health_score_int, 3)} - PROCEED WITH CAUTION"
+                    health_display = f"⚠️ *Health Score:* {health_score}/10 {SCORE_WARNINGS[min(health_score_int, 3)]} - PROCEED WITH CAUTION"
             elif health_category == 'healthy':
-                health_display = f"💚 *Health Score:* {health_score}/10 {'⭐' * min(health_score_int, 5)} - EXCELLENT CHOICE"
+                health_display = f"💚 *Health Score:* {health_score}/10 {SCORE_STARS[min(health_score_int, 5)]} - EXCELLENT CHOICE"
             else:
-                health_display = f"💛 *Health Score:* {health_score}/10 {'⭐' * min(health_score_int, 5)}"
+                health_display = f"💛 *Health Score:* {health_score}/10 {SCORE_STARS[min(health_score_int, 5)]}"
 
-            message += f"{health_display}\n"
-            message += f"📊 *Confidence:* {analysis['confidence']:.0f}%\n\n"
+            parts.append(f"{health_display}\n")
+            parts.append(f"📊 *Confidence:* {analysis['confidence']:.0f}%\n\n")
 
             # Macronutrients if available
             if analysis.get('total_carbs') or analysis.get('total_protein') or analysis.get('total_fat'):
-                message += "*Macronutrients:*\n"
+                parts.append("*Macronutrients:*\n")
                 if analysis.get('total_carbs'):
-                    message += f"🍞 Carbs: {analysis['total_carbs']:.0f}g\n"
+                    parts.append(f"🍞 Carbs: {analysis['total_carbs']:.0f}g\n")
                 if analysis.get('total_protein'):
-                    message += f"🥩 Protein: {analysis['total_protein']:.0f}g\n"
+                    parts.append(f"🥩 Protein: {analysis['total_protein']:.0f}g\n")
                 if analysis.get('total_fat'):
-                    message += f"🥑 Fat: {analysis['total_fat']:.0f}g\n"
-                message += "\n"
+                    parts.append(f"🥑 Fat: {analysis['total_fat']:.0f}g\n")
+                parts.append("\n")
 
             # Detailed food breakdown with enhanced formatting
             if 'food_items' in analysis and analysis['food_items']:
-                message += "🍽️ *Detailed Breakdown:*\n"
+                parts.append("🍽️ *Detailed Breakdown:*\n")
                 for i, item in enumerate(analysis['food_items'], 1):
                     item_name = safe_escape(item['name'])
                     portion = safe_escape(item.get('portion', 'unknown portion'))
@@ -671,12 +1227,10 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
                     else:
                         health_indicator = "🔴 Poor"
 
-                    message += f"{i}. **{item_name}** ({portion})\n"
-                    message += f"   🔥 {calories:.0f} cal"
-                    if cooking_method:
-                        message += f" • 👨‍🍳 {cooking_method}"
-                    message += f" • {health_indicator}\n"
-                message += "\n"
+                    cooking = f" • 👨‍🍳 {cooking_method}" if cooking_method else ""
+                    parts.append(f"{i}. **{item_name}** ({portion})\n"
+                                 f"   🔥 {calories:.0f} cal{cooking} • {health_indicator}\n")
+                parts.append("\n")
 
             # Enhanced witty comment section with proper contextualization
             if analysis.get('witty_comment'):
@@ -688,11 +1242,11 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
                     "For moderate: Balanced perspective"
                 ]):
                     if health_category == 'junk':
-                        message += f"💀 *REALITY CHECK:* {witty_comment}\n\n"
+                        parts.append(f"💀 *REALITY CHECK:* {witty_comment}\n\n")
                     elif health_category == 'healthy':
-                        message += f"🌟 *Great Choice!* {witty_comment}\n\n"
+                        parts.append(f"🌟 *Great Choice!* {witty_comment}\n\n")
                     else:
-                        message += f"💡 *Nutritional Insight:* {witty_comment}\n\n"
+                        parts.append(f"💡 *Nutritional Insight:* {witty_comment}\n\n")
 
             # Enhanced recommendations with proper contextualization
             if analysis.get('recommendations'):
@@ -704,21 +1258,21 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
                     "For moderate: Improvement suggestions"
                 ]):
                     if health_category == 'junk':
-                        message += f"🚨 *URGENT - YOUR HEALTH DEPENDS ON THIS:* {recommendations}\n\n"
+                        parts.append(f"🚨 *URGENT - YOUR HEALTH DEPENDS ON THIS:* {recommendations}\n\n")
                     elif health_category == 'healthy':
-                        message += f"✨ *Keep It Up:* {recommendations}\n\n"
+                        parts.append(f"✨ *Keep It Up:* {recommendations}\n\n")
                     else:
-                        message += f"🎯 *Suggestions:* {recommendations}\n\n"
+                        parts.append(f"🎯 *Suggestions:* {recommendations}\n\n")
 
             # Fun fact with enhanced presentation
             if analysis.get('fun_fact'):
                 fun_fact = safe_escape(analysis['fun_fact'])
-                message += f"🤓 *Did You Know?* {fun_fact}\n\n"
+                parts.append(f"🤓 *Did You Know?* {fun_fact}\n\n")
 
             # Additional notes with enhanced formatting (commented out for now)
             # if analysis.get('notes'):
             #     notes = escape_markdown(analysis['notes'])
-            #     message += f"📝 *Additional Notes:* {notes}\n\n"
+            #     parts.append(f"📝 *Additional Notes:* {notes}\n\n")
 
             # Add calorie estimation note
             total_calories = analysis.get('total_calories', 0)
@@ -726,13 +1280,13 @@ DO NOT IDENTIFY THE FOOD FROM THE IMAGE. THE USER ALREADY TOLD YOU WHAT IT IS.
                 calorie_range = self._get_calorie_range(total_calories)
                 food_description = analysis.get('description', 'this meal')
                 # Don't escape the parentheses in NB note as they don't need escaping in this context
-                message += f"*NB:* {calorie_range} (This is an estimate based on a typical serving size of {safe_escape(food_description)}, which may vary depending on preparation method and portion size)\n\n"
+                parts.append(f"*NB:* {calorie_range} (This is an estimate based on a typical serving size of {safe_escape(food_description)}, which may vary depending on preparation method and portion size)\n\n")
 
             # Enhanced call-to-action with visual separator
-            message += "─" * 25 + "\n"
-            message += "📝 *Ready to log this meal?*"
+            parts.append("─" * 25 + "\n")
+            parts.append("📝 *Ready to log this meal?*")
 
-            return message
+            return "".join(parts)
 
         except Exception as e:
             logger.error(f"Error formatting enhanced analysis for user: {e}")
@@ -10,7 +10,7 @@ from telegram.constants import ParseMode
 from PIL import Image
 
 from utils.config import Config
-from utils.helpers import validate_image_format, format_meal_summary, get_current_date, format_calories, format_timestamp_for_user
+from utils.helpers import validate_image_format, format_meal_summary, get_current_date, format_calories, format_timestamp_for_user, escape_markdown_safe, escape_markdown_emphasis
 from database.models import DatabaseManager
 from database.operations import MealOperations
 from database.mysql_manager import MySQLDatabaseManager
@@ -219,11 +219,11 @@ class BotHandlers:
             
             try:
                 # Open and process image with detailed error handling
-                logger.info(f"Opening image file: {temp_path}")
+                logger.info("Opening image file: %s", temp_path)
                 try:
                     with Image.open(temp_path) as image:
                         # Log image properties for debugging
-                        logger.info(f"Image opened successfully - Size: {image.size}, Mode: {image.mode}, Format: {image.format}")
+                        logger.info("Image opened successfully - Size: %s, Mode: %s, Format: %s", image.size, image.mode, image.format)
 
                         # Validate image
                         if image.size[0] < 10 or image.size[1] < 10:
@@ -232,15 +232,44 @@ class BotHandlers:
                         if image.size[0] > 10000 or image.size[1] > 10000:
                             logger.warning(f"Very large image detected: {image.size}")
 
+                        # Let the JPEG decoder scale large photos down (DCT scaling) instead
+                        # of decoding every pixel only to resize them away before upload
+                        max_edge = Config.ANALYSIS_IMAGE_MAX_EDGE
+                        image.draft('RGB', (max_edge, max_edge))
+
                         # Convert to RGB if necessary
                         if image.mode != 'RGB':
-                            logger.info(f"Converting image from {image.mode} to RGB")
+                            logger.info("Converting image from %s to RGB", image.mode)
                             image = image.convert('RGB')
 
+                        # Show the meal and calories as soon as they are streamed (STREAM_ANALYSIS)
+                        loop = asyncio.get_running_loop()
+                        headline_updates = []
+
+                        def show_headline(headline):
+                            headline_updates.append(asyncio.run_coroutine_threadsafe(
+                                processing_msg.edit_text(
+                                    f"🍽️ *{escape_markdown_safe(str(headline.get('description') or 'Your meal'))}* - "
+                                    f"about {format_calories(headline.get('total_calories') or 0)}\n\n"
+                                    "🔍 *Finishing the detailed breakdown...*",
+                                    parse_mode=ParseMode.MARKDOWN
+                                ),
+                                loop
+                            ))
+
                         # Analyze the image with caption context
                         logger.info("Starting AI analysis of food image")
-                        analysis_result, error = self.vision_analyzer.analyze_food_image(image, caption)
-                        logger.info(f"AI analysis completed - Success: {analysis_result is not None}, Error: {error}")
+                        analysis_result, error = await self.vision_analyzer.analyze_food_image_async(
+                            image, caption, on_headline=show_headline
+                        )
+                        logger.info("AI analysis completed - Success: %s, Error: %s", analysis_result is not None, error)
+
+                        # Let the headline edit land before the final message replaces it
+                        for update_future in headline_updates:
+                            try:
+                                await asyncio.wrap_future(update_future)
+                            except Exception as headline_error:
+                                logger.debug("Headline update skipped: %s", headline_error)
 
                 except IOError as io_error:
                     logger.error(f"Failed to open or read image file: {io_error}")
@@ -251,7 +280,7 @@ class BotHandlers:
 
                 # Clean up temp file
                 os.unlink(temp_path)
-                logger.debug(f"Cleaned up temp file: {temp_path}")
+                logger.debug("Cleaned up temp file: %s", temp_path)
                 
                 if error:
                     # Provide more specific error messages based on error type
@@ -349,7 +378,7 @@ class BotHandlers:
                 if os.path.exists(temp_path):
                     try:
                         os.unlink(temp_path)
-                        logger.debug(f"Cleaned up temp file: {temp_path}")
+                        logger.debug("Cleaned up temp file: %s", temp_path)
                     except Exception as cleanup_error:
                         logger.warning(f"Failed to cleanup temp file {temp_path}: {cleanup_error}")
                 
@@ -783,14 +812,14 @@ class BotHandlers:
             total_calories = sum(meal['calories'] for meal in meals)
             meal_count = len(meals)
 
-            message = (
+            parts = [
                 f"📅 **Meal History - {formatted_date}**\n\n"
                 f"🍽️ **Meals logged:** {meal_count}\n"
                 f"🔥 **Total calories:** {format_calories(total_calories)}\n\n"
-            )
+            ]
 
             if meal_count > 0:
-                message += "**Meals:**\n"
+                parts.append("**Meals:**\n")
                 for i, meal in enumerate(meals, 1):
                     try:
                         # Use the timezone-aware formatting function
@@ -798,13 +827,15 @@ class BotHandlers:
 
                         # Truncate description and escape markdown
                         description = meal['description'][:50] + "..." if len(meal['description']) > 50 else meal['description']
-                        description = description.replace('*', '\\*').replace('_', '\\_')
+                        description = escape_markdown_emphasis(description)
 
-                        message += f"{i}. {description} - {format_calories(meal['calories'])} ({time_str})\n"
+                        parts.append(f"{i}. {description} - {format_calories(meal['calories'])} ({time_str})\n")
                     except Exception as e:
                         logger.warning(f"Error formatting meal {i}: {e}")
                         continue
 
+            message = "".join(parts)
+
         # Determine navigation availability
         from datetime import datetime, timedelta
         try:
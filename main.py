@@ -18,6 +18,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.config import Config
 from database.factory import create_database_manager
 from bot.handlers import BotHandlers
+from ai.prompts import PROMPT_VERSION, get_prompt_hash
 
 # Configure logging
 logging.basicConfig(
@@ -46,6 +47,7 @@ class MealMetricsBot:
             # Validate configuration
             self.config.validate()
             logger.info("Configuration validated successfully")
+            logger.info(f"Prompt version {PROMPT_VERSION} (hash {get_prompt_hash()})")
             
             # Initialize database
             self.db_manager = create_database_manager()
@@ -55,8 +57,15 @@ class MealMetricsBot:
             self.handlers = BotHandlers(self.db_manager)
             logger.info("Bot handlers initialized successfully")
             
-            # Create application
-            self.application = Application.builder().token(self.config.TELEGRAM_BOT_TOKEN).build()
+            # Create application; updates are handled concurrently (bounded) so
+            # photos from different users can share batches instead of queueing
+            # behind each other's analyses
+            self.application = (
+                Application.builder()
+                .token(self.config.TELEGRAM_BOT_TOKEN)
+                .concurrent_updates(self.config.BATCH_MAX_SIZE * 4)
+                .build()
+            )
             
             # Register handlers
             self._register_handlers()
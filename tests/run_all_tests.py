@@ -62,6 +62,7 @@ def run_all_tests():
         ("test_nb_note.py", "NB Note and Contextualization Tests"),
         ("test_consistency.py", "Consistency Improvement Tests"),
         ("test_description_format.py", "Description Format Tests"),
+        ("test_prompts.py", "Prompt Tests"),
         ("test_mysql_connection.py", "MySQL Connection Tests"),
     ]
     
@@ -108,6 +109,7 @@ def run_specific_test(test_name):
         "nb": "test_nb_note.py",
         "consistency": "test_consistency.py",
         "format": "test_description_format.py",
+        "prompts": "test_prompts.py",
         "mysql": "test_mysql_connection.py",
     }
     
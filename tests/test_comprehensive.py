@@ -9,8 +9,10 @@ import sys
 import unittest
 import tempfile
 import json
+import asyncio
+import gzip
 from unittest.mock import Mock, patch, MagicMock
-from PIL import Image
+from PIL import Image, ImageDraw
 import sqlite3
 
 # Add the parent directory to Python path for imports
@@ -20,11 +22,15 @@ from utils.config import Config
 from utils.helpers import (
     format_calories, get_current_date, validate_image_format,
     format_meal_summary, escape_markdown_v2, sanitize_input,
-    parse_numeric_value, validate_user_input, format_confidence
+    parse_numeric_value, validate_user_input, format_confidence, loads_json,
+    escape_markdown_safe, escape_markdown_emphasis
 )
 from database.models import DatabaseManager
 from database.operations import MealOperations
 from ai.vision_analyzer import VisionAnalyzer
+from ai.batching import AsyncBatchQueue
+from ai.rate_limit import RateLimiter
+from ai.response_cache import ResponseCache, SemanticCache, perceptual_hash, image_digest, normalize_caption
 
 class TestHelperFunctions(unittest.TestCase):
     """Test utility helper functions"""
@@ -43,6 +49,13 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertEqual(parse_numeric_value("invalid", 50.0), 50.0)
         self.assertEqual(parse_numeric_value("", 25.0), 25.0)
     
+    def test_loads_json(self):
+        """Test JSON parsing from str and bytes"""
+        self.assertEqual(loads_json('{"calories": 250}'), {"calories": 250})
+        self.assertEqual(loads_json(b'[1, 2]'), [1, 2])
+        with self.assertRaises(json.JSONDecodeError):
+            loads_json('{"calories": ')
+    
     def test_escape_markdown_v2(self):
         """Test markdown escaping"""
         text = "Test_text*with[special]chars"
@@ -51,6 +64,16 @@ class TestHelperFunctions(unittest.TestCase):
         self.assertIn("\\*", escaped)
         self.assertIn("\\[", escaped)
         self.assertIn("\\]", escaped)
+
+    def test_escape_markdown_safe(self):
+        """Basic markdown escaping touches only emphasis, link and code markers"""
+        self.assertEqual(escape_markdown_safe("Fish_and*Chips [large] `x` (1.5)"),
+                         "Fish\\_and\\*Chips \\[large\\] \\`x\\` (1.5)")
+        self.assertEqual(escape_markdown_safe(None), "")
+
+    def test_escape_markdown_emphasis(self):
+        """Meal lists escape only asterisks and underscores"""
+        self.assertEqual(escape_markdown_emphasis("Fish_and*Chips [large]"), "Fish\\_and\\*Chips [large]")
     
     def test_sanitize_input(self):
         """Test input sanitization"""
@@ -171,9 +194,18 @@ class TestVisionAnalyzer(unittest.TestCase):
     """Test vision analyzer functionality"""
     
     def setUp(self):
-        """Set up vision analyzer"""
+        """Set up vision analyzer with a throwaway analysis cache"""
+        self.temp_cache = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_cache.close()
+        self.original_cache_path = Config.ANALYSIS_CACHE_PATH
+        Config.ANALYSIS_CACHE_PATH = self.temp_cache.name
         self.analyzer = VisionAnalyzer()
     
+    def tearDown(self):
+        """Restore cache path and clean up cache file"""
+        Config.ANALYSIS_CACHE_PATH = self.original_cache_path
+        os.unlink(self.temp_cache.name)
+    
     def test_format_analysis_for_user(self):
         """Test analysis formatting"""
         analysis = {
@@ -209,6 +241,695 @@ class TestVisionAnalyzer(unittest.TestCase):
         self.assertIn('DANGER ZONE', formatted)
         self.assertIn('REALITY CHECK', formatted)
 
+    def _api_response(self, content):
+        """Build a mocked OpenRouter response carrying the given message content"""
+        response = Mock()
+        response.status_code = 200
+        response.content = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+        response.json.return_value = json.loads(response.content)
+        return response
+
+    def _sent_payload(self, mock_post):
+        """Decode the JSON body of the most recent mocked API request"""
+        return json.loads(mock_post.call_args.kwargs['data'])
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_junk_food_gets_reality_check_follow_up(self, mock_post):
+        """Junk food analyses get a second call for the reality check"""
+        first_pass = json.dumps({
+            'description': 'Cheeseburger, Fries',
+            'total_calories': 1100,
+            'confidence': 90,
+            'health_category': 'junk',
+            'health_score': 2,
+            'witty_comment': 'Tasty!',
+            'recommendations': 'Enjoy.'
+        })
+        follow_up = json.dumps({
+            'witty_comment': 'Your arteries are filing a complaint.',
+            'recommendations': 'Swap the fries for a salad.'
+        })
+        mock_post.side_effect = [self._api_response(first_pass), self._api_response(follow_up)]
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='brown'))
+
+        self.assertIsNone(error)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(result['witty_comment'], 'Your arteries are filing a complaint.')
+        self.assertEqual(result['recommendations'], 'Swap the fries for a salad.')
+        response_format = self._sent_payload(mock_post)['response_format']
+        self.assertEqual(response_format['json_schema']['name'], 'reality_check')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_healthy_food_skips_reality_check(self, mock_post):
+        """Non-junk analyses make a single call"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Green Salad',
+            'total_calories': 150,
+            'confidence': 90,
+            'health_category': 'healthy',
+            'health_score': 9
+        }))
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='green'))
+
+        self.assertIsNone(error)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(result['description'], 'Green Salad')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_quantization_preference_sent(self, mock_post):
+        """Configured quantizations are passed as an OpenRouter provider preference"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': 200, 'confidence': 80
+        }))
+
+        with patch.object(Config, 'OPENROUTER_QUANTIZATIONS', ['fp8']):
+            self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'))
+
+        payload = self._sent_payload(mock_post)
+        self.assertEqual(payload['provider'], {'quantizations': ['fp8']})
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_claude_requests_enable_prompt_caching(self, mock_post):
+        """Claude-routed requests send the prompt caching header; others do not"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': 200, 'confidence': 80
+        }))
+        payload = {"messages": [], "max_tokens": 100}
+
+        self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['anthropic/claude-3.5-sonnet'])
+        self.assertIn('anthropic-beta', mock_post.call_args.kwargs['headers'])
+
+        self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['google/gemini-2.5-flash-preview'])
+        self.assertNotIn('anthropic-beta', mock_post.call_args.kwargs['headers'])
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_uploaded_image_sent_as_url(self, mock_post):
+        """With an uploader configured the photo goes out as its URL; a failed upload falls back inline"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': 200, 'confidence': 80
+        }))
+        self.analyzer._uploader = Mock()
+        self.analyzer._uploader.upload.return_value = 'https://bucket.example/meal.webp?sig=1'
+
+        self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'), "rice")
+        image_url = self._sent_payload(mock_post)['messages'][1]['content'][1]['image_url']['url']
+        self.assertEqual(image_url, 'https://bucket.example/meal.webp?sig=1')
+
+        self.analyzer._uploader.upload.side_effect = RuntimeError("bucket unavailable")
+        self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'), "fried rice")
+        image_url = self._sent_payload(mock_post)['messages'][1]['content'][1]['image_url']['url']
+        self.assertTrue(image_url.startswith('data:image/'))
+
+    def test_batch_window_configurable(self):
+        """Batch size and window come from the configuration"""
+        with patch.object(Config, 'BATCH_MAX_SIZE', 16), patch.object(Config, 'BATCH_MAX_WAIT_MS', 250):
+            analyzer = VisionAnalyzer()
+
+        self.assertEqual(analyzer._batch_queue.max_batch, 16)
+        self.assertEqual(analyzer._batch_queue.max_wait, 0.25)
+
+    def test_requests_share_keepalive_session(self):
+        """Every API call goes through the analyzer's pooled session"""
+        response = self._api_response(json.dumps({'description': 'Rice', 'total_calories': 200, 'confidence': 80}))
+        with patch.object(self.analyzer._session, 'post', return_value=response) as session_post:
+            self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'), "rice")
+            self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'), "fried rice")
+
+        self.assertEqual(session_post.call_count, 2)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_max_tokens_capped(self, mock_post):
+        """The output cap comes from the configuration, with headroom for thinking variants"""
+        mock_post.return_value = self._api_response('{}')
+
+        with patch.object(Config, 'ANALYSIS_MAX_TOKENS', 600):
+            payload = self.analyzer._build_payload([], "meal_analysis", {}, 1)
+        self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['anthropic/claude-3.5-sonnet'])
+        self.assertEqual(self._sent_payload(mock_post)['max_tokens'], 600)
+
+        self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['google/gemini-2.5-flash-preview:thinking'])
+        self.assertGreater(self._sent_payload(mock_post)['max_tokens'], 600)
+
+    @patch('ai.vision_analyzer.time.sleep')
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_transient_errors_retried_with_backoff(self, mock_post, mock_sleep):
+        """429/5xx responses are retried on the same model, honoring Retry-After"""
+        throttled = Mock(status_code=429, headers={'Retry-After': '3'})
+        unavailable = Mock(status_code=503, headers={})
+        mock_post.side_effect = [throttled, unavailable, self._api_response('{}')]
+
+        response, model, _ = self.analyzer._post_with_fallback(
+            {"messages": [], "max_tokens": 100}, self.analyzer._headers(), ['some/model']
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(model, 'some/model')
+        self.assertEqual(mock_sleep.call_args_list[0].args, (3.0,))
+        self.assertLessEqual(mock_sleep.call_args_list[1].args[0], 2.0)
+        throttled.close.assert_called_once()
+        unavailable.close.assert_called_once()
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_failed_response_closed_before_fallback(self, mock_post):
+        """A non-200 response is closed before the next model is tried"""
+        rejected = Mock(status_code=400, headers={}, text='bad request')
+        mock_post.side_effect = [rejected, self._api_response('{}')]
+
+        response, model, _ = self.analyzer._post_with_fallback(
+            {"messages": [], "max_tokens": 100}, self.analyzer._headers(), ['some/model', 'other/model']
+        )
+
+        self.assertEqual(model, 'other/model')
+        rejected.close.assert_called_once()
+
+    @patch('ai.vision_analyzer.time.sleep')
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_outage_opens_circuit_breaker(self, mock_post, mock_sleep):
+        """Repeated transient failures make later calls fail without a request"""
+        mock_post.return_value = Mock(status_code=503, headers={})
+        payload = {"messages": [], "max_tokens": 100}
+
+        with patch.object(self.analyzer._breaker, 'threshold', 2):
+            for _ in range(2):
+                response, _, _ = self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['some/model'])
+                self.assertIsNone(response)
+            calls = mock_post.call_count
+
+            response, _, error = self.analyzer._post_with_fallback(payload, self.analyzer._headers(), ['some/model'])
+
+        self.assertIsNone(response)
+        self.assertIn("temporarily unavailable", error)
+        self.assertEqual(mock_post.call_count, calls)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_gzip_request_body(self, mock_post):
+        """With GZIP_REQUESTS the payload is sent compressed with a matching header"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': 200, 'confidence': 80
+        }))
+
+        with patch.object(Config, 'GZIP_REQUESTS', True):
+            self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'))
+
+        kwargs = mock_post.call_args.kwargs
+        self.assertEqual(kwargs['headers']['Content-Encoding'], 'gzip')
+        payload = json.loads(gzip.decompress(kwargs['data']))
+        self.assertEqual(payload['messages'][0]['role'], 'system')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_batch_sent_as_one_multi_image_request(self, mock_post):
+        """Concurrent photos share one request and get results back in order"""
+        mock_post.return_value = self._api_response(json.dumps({'analyses': [
+            {'description': 'Coffee', 'total_calories': 5, 'confidence': 90},
+            {'description': 'Green Salad', 'total_calories': 150, 'confidence': 85}
+        ]}))
+        batch = [(Image.new('RGB', (64, 64), color='saddlebrown'), 'coffee', None),
+                 (Image.new('RGB', (64, 64), color='green'), None, None)]
+
+        results = asyncio.run(self.analyzer._analyze_batch(batch))
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual([result['description'] for result, _ in results], ['Coffee', 'Green Salad'])
+        payload = self._sent_payload(mock_post)
+        images = [part for part in payload['messages'][1]['content'] if part['type'] == 'image_url']
+        self.assertEqual(len(images), 2)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_batch_keeps_cascade_per_photo(self, mock_post):
+        """With a fast model configured, batched photos each get the cheap first pass"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Banana', 'total_calories': 105, 'confidence': 92
+        }))
+        batch = [(Image.new('RGB', (64, 64), color='yellow'), None, None),
+                 (Image.new('RGB', (64, 64), color='orange'), None, None)]
+
+        with patch.object(Config, 'OPENROUTER_FAST_MODEL', 'fast/model'):
+            results = asyncio.run(self.analyzer._analyze_batch(batch))
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertTrue(all(loads_json(call.kwargs['data'])['model'] == 'fast/model'
+                            for call in mock_post.call_args_list))
+        self.assertEqual([error for _, error in results], [None, None])
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_batch_falls_back_on_mismatched_response(self, mock_post):
+        """A multi-image reply with the wrong number of analyses falls back to per-photo calls"""
+        single = self._api_response(json.dumps({'description': 'Rice', 'total_calories': 200, 'confidence': 80}))
+        mock_post.side_effect = [
+            self._api_response(json.dumps({'analyses': [{'description': 'Rice', 'total_calories': 200, 'confidence': 80}]})),
+            single, single
+        ]
+        batch = [(Image.new('RGB', (64, 64), color='white'), 'rice', None),
+                 (Image.new('RGB', (64, 64), color='yellow'), 'fried rice', None)]
+
+        results = asyncio.run(self.analyzer._analyze_batch(batch))
+
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertTrue(all(error is None for _, error in results))
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_short_key_response_expanded(self, mock_post):
+        """Abbreviated keys in the model reply are expanded to full field names"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Pancakes', 'tc': 520, 'confidence': 80, 'hc': 'moderate',
+            'fi': [{'name': 'Pancakes', 'portion': '3 pieces', 'calories': 520, 'cm': 'pan-fried'}]
+        }))
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='tan'))
+
+        self.assertIsNone(error)
+        self.assertEqual(result['total_calories'], 520)
+        self.assertEqual(result['food_items'][0]['cooking_method'], 'pan-fried')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_truncated_reply_recovered(self, mock_post):
+        """A reply cut off mid-field keeps every complete field, including food items"""
+        reply = json.dumps({
+            'description': 'Rice, Dal', 'tc': 350,
+            'fi': [{'name': 'Rice', 'calories': 200}, {'name': 'Dal', 'calories': 150}],
+            'hs': 7, 'wc': 'A classic combination that keeps you full'
+        })
+        mock_post.return_value = self._api_response(reply[:reply.index('keeps')])
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='yellow'))
+
+        self.assertIsNone(error)
+        self.assertEqual(result['total_calories'], 350)
+        self.assertEqual([item['name'] for item in result['food_items']], ['Rice', 'Dal'])
+        self.assertEqual(result['health_score'], 7)
+        self.assertEqual(result['notes'], "Analysis recovered from partial response")
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_health_category_index_mapped(self, mock_post):
+        """An integer health category maps to its name and still triggers the reality check"""
+        mock_post.side_effect = [
+            self._api_response(json.dumps({'description': 'Donut', 'total_calories': 300, 'confidence': 90, 'hc': 2})),
+            self._api_response(json.dumps({'witty_comment': 'Sugar rush incoming.', 'recommendations': 'Pair with protein.'}))
+        ]
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='pink'))
+
+        self.assertIsNone(error)
+        self.assertEqual(result['health_category'], 'junk')
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_numeric_fields_clamped(self, mock_post):
+        """Every numeric field is coerced to a float within its schema range"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': -20, 'confidence': 140,
+            'health_category': 'healthy', 'health_score': 0, 'total_carbs': 45, 'total_protein': -3,
+            'total_fat': '1.5g',
+            'food_items': [{'name': 'Rice', 'calories': '200', 'fat': -1, 'health_score': 12}]
+        }))
+
+        result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'))
+
+        self.assertIsNone(error)
+        self.assertEqual(result['total_calories'], 0.0)
+        self.assertEqual(result['confidence'], 100.0)
+        self.assertEqual(result['health_score'], 1.0)
+        self.assertEqual(result['total_protein'], 0.0)
+        self.assertEqual(result['total_fat'], 1.5)
+        item = result['food_items'][0]
+        self.assertEqual((item['calories'], item['fat'], item['health_score']), (200.0, 0.0, 10.0))
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_cascade_accepts_confident_fast_model(self, mock_post):
+        """A confident cheap-model answer is used without calling the strong model"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Banana', 'total_calories': 105, 'confidence': 92
+        }))
+
+        with patch.object(Config, 'OPENROUTER_FAST_MODEL', 'fast/model'):
+            result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='yellow'))
+
+        self.assertIsNone(error)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self._sent_payload(mock_post)['model'], 'fast/model')
+        image_url = self._sent_payload(mock_post)['messages'][1]['content'][1]['image_url']['url']
+        self.assertTrue(image_url.startswith(f"data:image/{Config.ANALYSIS_IMAGE_FORMAT.lower()};base64,"))
+        self.assertEqual(result['description'], 'Banana')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_cascade_escalates_low_confidence(self, mock_post):
+        """A low-confidence cheap-model answer is re-analyzed by the strong model"""
+        mock_post.side_effect = [
+            self._api_response(json.dumps({'description': 'Mixed Dish', 'total_calories': 400, 'confidence': 45})),
+            self._api_response(json.dumps({'description': 'Chicken Biryani', 'total_calories': 650, 'confidence': 85}))
+        ]
+
+        with patch.object(Config, 'OPENROUTER_FAST_MODEL', 'fast/model'):
+            result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='orange'))
+
+        self.assertIsNone(error)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertNotEqual(self._sent_payload(mock_post)['model'], 'fast/model')
+        self.assertEqual(result['description'], 'Chicken Biryani')
+        self.assertEqual(self.analyzer._escalations, 1)
+
+    def test_prepare_image_downscales_large_photos(self):
+        """Large photos are shrunk to the upload edge without touching the caller's image"""
+        import base64, io
+        photo = Image.new('RGB', (2000, 1500), color='orange')
+
+        encoded = self.analyzer._prepare_image(photo)
+
+        uploaded = Image.open(io.BytesIO(base64.b64decode(encoded)))
+        self.assertEqual(max(uploaded.size), Config.ANALYSIS_IMAGE_MAX_EDGE)
+        self.assertEqual(uploaded.format, Config.ANALYSIS_IMAGE_FORMAT)
+        self.assertEqual(photo.size, (2000, 1500))
+
+    @patch('ai.vision_analyzer.enhance_image_for_analysis', side_effect=lambda image: image)
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_new_caption_reuses_prepared_image(self, mock_post, mock_enhance):
+        """Re-analyzing a photo with a different caption skips re-encoding it"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Rice', 'total_calories': 200, 'confidence': 80
+        }))
+        image = Image.new('RGB', (64, 64), color='beige')
+
+        self.analyzer.analyze_food_image(image, "rice")
+        self.analyzer.analyze_food_image(image, "fried rice")
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_enhance.call_count, 1)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_identical_resubmission_hits_cache(self, mock_post):
+        """Same image and caption are served from the cache; a new caption is not"""
+        mock_post.return_value = self._api_response(json.dumps({
+            'description': 'Mango Juice',
+            'total_calories': 180,
+            'confidence': 85,
+            'health_category': 'moderate'
+        }))
+        image = Image.new('RGB', (64, 64), color='orange')
+
+        first, _ = self.analyzer.analyze_food_image(image, "mango juice")
+        second, error = self.analyzer.analyze_food_image(image, "mango juice")
+
+        self.assertIsNone(error)
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(second, first)
+
+        self.analyzer.analyze_food_image(image, "orange juice")
+        self.assertEqual(mock_post.call_count, 2)
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_bypass_cache_refreshes_analysis(self, mock_post):
+        """bypass_cache skips the cached analysis and stores the fresh one"""
+        mock_post.side_effect = [
+            self._api_response(json.dumps({'description': 'Tea', 'total_calories': 40, 'confidence': 70})),
+            self._api_response(json.dumps({'description': 'Milk Tea', 'total_calories': 90, 'confidence': 85}))
+        ]
+        image = Image.new('RGB', (64, 64), color='tan')
+
+        self.analyzer.analyze_food_image(image, "tea")
+        retried, _ = self.analyzer.analyze_food_image(image, "tea", bypass_cache=True)
+        cached, _ = self.analyzer.analyze_food_image(image, "tea")
+
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(retried['description'], 'Milk Tea')
+        self.assertEqual(cached['description'], 'Milk Tea')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_stream_stops_before_trailing_field(self, mock_post):
+        """Streamed replies are closed once the stop field starts"""
+        reply = json.dumps({
+            'description': 'Rice, Dal',
+            'fi': [{'name': 'Rice', 'calories': 200, 'notes': 'nested'}],
+            'tc': 350,
+            'confidence': 80,
+            'notes': 'never needed'
+        })
+        chunks = [reply[i:i + 7] for i in range(0, len(reply), 7)]
+        lines = [': OPENROUTER PROCESSING', '']
+        lines += ['data: ' + json.dumps({'choices': [{'delta': {'content': chunk}}]}) for chunk in chunks]
+        response = Mock()
+        response.status_code = 200
+        response.iter_lines.return_value = iter(lines + ['data: [DONE]'])
+        mock_post.return_value = response
+
+        with patch.object(Config, 'STREAM_STOP_FIELD', 'notes'):
+            result, error = self.analyzer.analyze_food_image(Image.new('RGB', (64, 64), color='white'))
+
+        self.assertIsNone(error)
+        self.assertTrue(mock_post.call_args.kwargs['stream'])
+        self.assertEqual(result['total_calories'], 350)
+        self.assertNotIn('notes', result)
+        response.close.assert_called_once()
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_stream_reports_headline_early(self, mock_post):
+        """The description and calories are handed over before the breakdown is streamed"""
+        reply = json.dumps({
+            'description': 'Rice, Dal',
+            'total_calories': 350,
+            'food_items': [{'name': 'Rice', 'calories': 200}],
+            'confidence': 80
+        })
+        seen_before_breakdown = []
+        chunks = [reply[i:i + 5] for i in range(0, len(reply), 5)]
+        lines = ['data: ' + json.dumps({'choices': [{'delta': {'content': chunk}}]}) for chunk in chunks]
+        response = Mock()
+        response.status_code = 200
+        response.iter_lines.return_value = iter(lines + ['data: [DONE]'])
+        mock_post.return_value = response
+
+        with patch.object(Config, 'STREAM_ANALYSIS', True), patch.object(Config, 'SHORT_JSON_KEYS', False):
+            result, error = self.analyzer.analyze_food_image(
+                Image.new('RGB', (64, 64), color='white'), on_headline=seen_before_breakdown.append
+            )
+
+        self.assertIsNone(error)
+        self.assertEqual(seen_before_breakdown, [{'description': 'Rice, Dal', 'total_calories': 350}])
+        self.assertEqual(result['food_items'][0]['name'], 'Rice')
+
+    @patch('ai.vision_analyzer.requests.Session.post')
+    def test_stream_headline_ignores_field_order(self, mock_post):
+        """The headline fires once total_calories closes, whatever field the model writes next"""
+        reply = json.dumps({
+            'description': 'Rice',
+            'fi': [{'name': 'Rice', 'tc': 1}],
+            'tc': 200,
+            'confidence': 80,
+            'notes': 'x' * 40
+        })
+        headlines = []
+        chunks = [reply[i:i + 5] for i in range(0, len(reply), 5)]
+        lines = ['data: ' + json.dumps({'choices': [{'delta': {'content': chunk}}]}) for chunk in chunks]
+        response = Mock()
+        response.iter_lines.return_value = iter(lines + ['data: [DONE]'])
+
+        with patch.object(Config, 'SHORT_JSON_KEYS', True):
+            self.analyzer._read_streamed_content(response, on_headline=headlines.append)
+
+        self.assertEqual(headlines, [{'description': 'Rice', 'total_calories': 200}])
+
+    def test_identical_inflight_requests_share_analysis(self):
+        """A photo already being analyzed is not sent again by a concurrent caller"""
+        submitted = []
+
+        async def submit(item):
+            submitted.append(item)
+            await asyncio.sleep(0.01)
+            return {'description': 'Rice'}, None
+
+        async def run():
+            image = Image.new('RGB', (64, 64), color='white')
+            return await asyncio.gather(
+                self.analyzer.analyze_food_image_async(image, 'Rice'),
+                self.analyzer.analyze_food_image_async(image.copy(), 'Rice'),
+                self.analyzer.analyze_food_image_async(image.copy(), 'rice')
+            )
+
+        with patch.object(self.analyzer._batch_queue, 'submit', side_effect=submit):
+            results = asyncio.run(run())
+
+        # A different caption is a different request to the model
+        self.assertEqual(len(submitted), 2)
+        self.assertEqual(results[0], results[1])
+        self.assertIsNot(results[0][0], results[1][0])
+        self.assertEqual(self.analyzer._inflight, {})
+
+class TestAsyncBatchQueue(unittest.TestCase):
+    """Test request coalescing"""
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Requests arriving together are handled in one call, results in order"""
+        batches = []
+
+        async def handler(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        async def run():
+            queue = AsyncBatchQueue(handler, max_batch=8, max_wait=0.01)
+            return await asyncio.gather(*(queue.submit(i) for i in range(3)))
+
+        results = asyncio.run(run())
+        self.assertEqual(results, [0, 2, 4])
+        self.assertEqual(batches, [[0, 1, 2]])
+
+    def test_full_batch_flushes_immediately(self):
+        """A full batch is dispatched without waiting for the timer"""
+        batches = []
+
+        async def handler(items):
+            batches.append(list(items))
+            return items
+
+        async def run():
+            queue = AsyncBatchQueue(handler, max_batch=2, max_wait=10)
+            return await asyncio.wait_for(asyncio.gather(*(queue.submit(i) for i in range(4))), timeout=1)
+
+        self.assertEqual(asyncio.run(run()), [0, 1, 2, 3])
+        self.assertEqual(batches, [[0, 1], [2, 3]])
+
+    def test_handler_error_reaches_every_caller(self):
+        """A failing batch raises in each waiting caller"""
+        async def handler(items):
+            raise RuntimeError("boom")
+
+        async def run():
+            queue = AsyncBatchQueue(handler, max_wait=0.01)
+            return await asyncio.gather(queue.submit(1), queue.submit(2), return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    def test_lone_request_skips_the_timer(self):
+        """With nothing in flight a request is dispatched without waiting max_wait"""
+        async def handler(items):
+            return items
+
+        async def run():
+            queue = AsyncBatchQueue(handler, max_wait=30)
+            return await asyncio.wait_for(queue.submit(1), timeout=1)
+
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_cancelled_batch_cancels_callers(self):
+        """Cancelling the batch task does not leave callers waiting forever"""
+        async def handler(items):
+            await asyncio.sleep(30)
+
+        async def run():
+            queue = AsyncBatchQueue(handler, max_wait=0)
+            caller = asyncio.ensure_future(queue.submit(1))
+            await asyncio.sleep(0.01)
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task() and task is not caller:
+                    task.cancel()
+            return await asyncio.wait_for(asyncio.gather(caller, return_exceptions=True), timeout=1)
+
+        results = asyncio.run(run())
+        self.assertIsInstance(results[0], asyncio.CancelledError)
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the API request rate limit"""
+
+    def test_waits_once_burst_is_spent(self):
+        """A full bucket allows a burst, then calls wait for tokens to refill"""
+        clock = [1000.0]
+        sleeps = []
+
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        with patch('ai.rate_limit.time.monotonic', side_effect=lambda: clock[0]), \
+                patch('ai.rate_limit.time.sleep', side_effect=fake_sleep):
+            limiter = RateLimiter(2, period=60)
+            limiter.acquire()
+            limiter.acquire()
+            self.assertEqual(sleeps, [])
+            limiter.acquire()
+
+        self.assertEqual(len(sleeps), 1)
+        self.assertAlmostEqual(sleeps[0], 30.0)
+
+class TestSemanticCache(unittest.TestCase):
+    """Test near-duplicate analysis cache"""
+
+    def setUp(self):
+        """Set up a throwaway semantic cache"""
+        self.temp_db = tempfile.NamedTemporaryFile(delete=False, suffix='.db')
+        self.temp_db.close()
+        self.cache = SemanticCache(self.temp_db.name, max_distance=6)
+        self.analysis = {'description': 'Coffee', 'total_calories': 5, 'confidence': 90}
+
+    def tearDown(self):
+        """Clean up cache file"""
+        os.unlink(self.temp_db.name)
+
+    def _meal_photo(self):
+        """Draw a simple plate-like test image"""
+        image = Image.new('RGB', (300, 300), color='white')
+        ImageDraw.Draw(image).ellipse((50, 50, 200, 200), fill='brown')
+        return image
+
+    def test_near_duplicate_hits(self):
+        """A rescaled photo with an equivalent caption reuses the analysis"""
+        photo = self._meal_photo()
+        self.cache.store(perceptual_hash(photo), "Coffee", "v1", self.analysis)
+        result = self.cache.lookup(perceptual_hash(photo.resize((280, 280))), "  coffee! ", "v1")
+        self.assertEqual(result, self.analysis)
+
+    def test_image_hashes_computed_once(self):
+        """Digest and perceptual hash are computed once per image object"""
+        photo = self._meal_photo()
+        with patch('ai.response_cache._compute_image_digest', wraps=lambda image: b'digest') as compute_digest:
+            self.assertEqual(image_digest(photo), image_digest(photo))
+        with patch('ai.response_cache._compute_perceptual_hash', wraps=lambda image: 42) as compute_phash:
+            self.assertEqual(perceptual_hash(photo), perceptual_hash(photo))
+        self.assertEqual(compute_digest.call_count, 1)
+        self.assertEqual(compute_phash.call_count, 1)
+
+    def test_different_photo_misses(self):
+        """A visually different photo does not reuse the analysis"""
+        self.cache.store(perceptual_hash(self._meal_photo()), "coffee", "v1", self.analysis)
+        other = Image.new('RGB', (300, 300), color='white')
+        ImageDraw.Draw(other).rectangle((0, 0, 150, 300), fill='green')
+        self.assertIsNone(self.cache.lookup(perceptual_hash(other), "coffee", "v1"))
+
+    def test_different_caption_or_prompt_misses(self):
+        """Caption and prompt version must match"""
+        phash = perceptual_hash(self._meal_photo())
+        self.cache.store(phash, "coffee", "v1", self.analysis)
+        self.assertIsNone(self.cache.lookup(phash, "tea", "v1"))
+        self.assertIsNone(self.cache.lookup(phash, "coffee", "v2"))
+
+    def test_non_ascii_captions_keep_their_words(self):
+        """Captions in other scripts neither collide with each other nor with no caption"""
+        phash = perceptual_hash(self._meal_photo())
+        self.cache.store(phash, None, "v1", self.analysis)
+        self.assertIsNone(self.cache.lookup(phash, "বিরিয়ানি ২ প্লেট", "v1"))
+        self.assertIsNone(self.cache.lookup(phash, "🍕🍕", "v1"))
+
+        self.cache.store(phash, "宫保鸡丁", "v1", self.analysis)
+        self.assertIsNone(self.cache.lookup(phash, "麻婆豆腐", "v1"))
+        self.assertIsNotNone(self.cache.lookup(phash, "宫保鸡丁!", "v1"))
+        self.assertEqual(normalize_caption("Café  Crème!"), "café crème")
+
+    def test_expired_entries_miss(self):
+        """Entries older than the TTL are ignored"""
+        self.cache.ttl_seconds = -1
+        phash = perceptual_hash(self._meal_photo())
+        self.cache.store(phash, "coffee", "v1", self.analysis)
+        self.assertIsNone(self.cache.lookup(phash, "coffee", "v1"))
+
+    def test_exact_cache_ttl(self):
+        """Exact-match entries expire with the TTL too"""
+        key = ResponseCache.make_key(b"pixels", "coffee", "v1")
+        fresh = ResponseCache(self.temp_db.name, ttl_seconds=3600)
+        fresh.put(key, self.analysis)
+        self.assertEqual(fresh.get(key), self.analysis)
+        self.assertIsNone(ResponseCache(self.temp_db.name, ttl_seconds=-1).get(key))
+
 def run_comprehensive_tests():
     """Run all comprehensive tests"""
     print("Running Comprehensive MealMetrics Tests")
@@ -223,6 +944,9 @@ def run_comprehensive_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestConfigValidation))
     suite.addTests(loader.loadTestsFromTestCase(TestDatabaseOperations))
     suite.addTests(loader.loadTestsFromTestCase(TestVisionAnalyzer))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncBatchQueue))
+    suite.addTests(loader.loadTestsFromTestCase(TestRateLimiter))
+    suite.addTests(loader.loadTestsFromTestCase(TestSemanticCache))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Test AI prompt size and structure
+"""
+
+import sys
+import os
+import re
+import unittest
+
+# Add the parent directory to Python path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.prompts import (
+    CALORIE_ANALYSIS_PROMPT, REALITY_CHECK_EXAMPLES, JUNK_FOOD_RULES, JUNK_FOOD_ADDENDUM, get_prompt,
+    CALORIE_JSON_SCHEMA, CAPTION_OVERRIDE_TEMPLATE, build_calorie_messages, build_batch_calorie_messages,
+    count_tokens, PROMPT_TOKENIZER as DEFAULT_PROMPT_TOKENIZER
+)
+
+# Regression ceiling for the per-request prompt, in tokens
+MAX_PROMPT_TOKENS = 1000
+MAX_DESCRIPTION_PROMPT_TOKENS = 600
+
+# get_prompt_source_hash() for each PROMPT_VERSION
+PROMPT_SOURCE_HASHES = {
+    1: "d0c0cd83f94c75ba",
+    2: "4e423963396f263e",
+    3: "b18560aacdff5496",
+    4: "812ddbe581511ad2",
+}
+
+# Pictographs and dingbats that cost several tokens each
+EMOJI_PATTERN = re.compile(r"[\U0001F000-\U0001FFFF\u2600-\u27BF]")
+
+# Tokenizer encoding to measure with; set to match the serving model
+PROMPT_TOKENIZER = os.getenv('PROMPT_TOKENIZER', DEFAULT_PROMPT_TOKENIZER)
+
+class TestCaloriePrompt(unittest.TestCase):
+    """Test the calorie analysis prompt"""
+
+    def test_prompt_token_budget(self):
+        """Prompt stays under the token budget"""
+        self.assertLess(count_tokens(CALORIE_ANALYSIS_PROMPT, PROMPT_TOKENIZER), MAX_PROMPT_TOKENS)
+
+    def test_reality_check_examples_not_in_prompt(self):
+        """Junk food few-shot examples are not sent on every request"""
+        self.assertNotIn(REALITY_CHECK_EXAMPLES.strip(), CALORIE_ANALYSIS_PROMPT)
+
+    def test_junk_food_rules_only_in_addendum(self):
+        """Junk food guidance is sent only in the follow-up prompt"""
+        self.assertNotIn(JUNK_FOOD_RULES.strip(), CALORIE_ANALYSIS_PROMPT)
+        self.assertIn(JUNK_FOOD_RULES.strip(), JUNK_FOOD_ADDENDUM)
+        self.assertIn(REALITY_CHECK_EXAMPLES.strip(), JUNK_FOOD_ADDENDUM)
+
+    def test_no_emoji_in_prompts(self):
+        """Model-facing prompts use plain ASCII emphasis instead of emoji"""
+        self.assertEqual(EMOJI_PATTERN.findall(CALORIE_ANALYSIS_PROMPT), [])
+        self.assertEqual(EMOJI_PATTERN.findall(JUNK_FOOD_ADDENDUM), [])
+
+    def test_prompt_built_once(self):
+        """Lazy prompt accessor returns the same cached string"""
+        self.assertIs(get_prompt(), get_prompt())
+        self.assertEqual(get_prompt(), CALORIE_ANALYSIS_PROMPT)
+
+    def test_prompt_hash(self):
+        """Prompt hash is stable and exposed as PROMPT_HASH"""
+        from ai.prompts import PROMPT_HASH, get_prompt_hash
+        self.assertEqual(PROMPT_HASH, get_prompt_hash())
+        self.assertEqual(len(PROMPT_HASH), 32)
+
+    def test_prompt_hash_covers_templates(self):
+        """Editing a per-request template changes the cache version"""
+        import ai.prompts as prompts
+        original_hash = prompts.get_prompt_hash()
+        original_template = prompts.CAPTION_OVERRIDE_TEMPLATE
+        try:
+            prompts.CAPTION_OVERRIDE_TEMPLATE = original_template + " "
+            prompts.get_prompt_source_hash.cache_clear()
+            prompts.get_prompt_hash.cache_clear()
+            self.assertNotEqual(prompts.get_prompt_hash(), original_hash)
+        finally:
+            prompts.CAPTION_OVERRIDE_TEMPLATE = original_template
+            prompts.get_prompt_source_hash.cache_clear()
+            prompts.get_prompt_hash.cache_clear()
+        self.assertEqual(prompts.get_prompt_hash(), original_hash)
+
+    def test_prompt_source_pinned_to_version(self):
+        """Prompt text only changes together with a PROMPT_VERSION bump"""
+        from ai.prompts import PROMPT_VERSION, get_prompt_source_hash
+        self.assertEqual(get_prompt_source_hash(), PROMPT_SOURCE_HASHES.get(PROMPT_VERSION),
+                         "Prompt files changed: bump PROMPT_VERSION and pin the new hash in PROMPT_SOURCE_HASHES")
+
+    def test_prompt_token_count_cached(self):
+        """Prompt token count is computed once and exposed as CALORIE_PROMPT_TOKENS"""
+        from ai.prompts import CALORIE_PROMPT_TOKENS, get_prompt_token_count
+        self.assertEqual(CALORIE_PROMPT_TOKENS, get_prompt_token_count())
+        self.assertLess(0, CALORIE_PROMPT_TOKENS)
+        self.assertLess(get_prompt_token_count(fast=True), CALORIE_PROMPT_TOKENS)
+
+    def test_fast_prompt_drops_challenging_images(self):
+        """Fast cascade prompt is the full prompt minus the challenging-image guidance"""
+        fast = get_prompt(fast=True)
+        self.assertIn("CHALLENGING IMAGES", CALORIE_ANALYSIS_PROMPT)
+        self.assertNotIn("CHALLENGING IMAGES", fast)
+        self.assertIn("CONFIDENCE:", fast)
+        self.assertLess(len(fast), len(CALORIE_ANALYSIS_PROMPT))
+
+    def test_rulebook_can_leave_context(self):
+        """Without the in-context rulebook only the core rules are sent"""
+        from unittest.mock import patch
+        from ai.prompts import get_prompt_rulebook
+        from utils.config import Config
+        self.assertIn("PORTION REFERENCES", CALORIE_ANALYSIS_PROMPT)
+        with patch.object(Config, 'PROMPT_RULEBOOK_IN_CONTEXT', False):
+            core = get_prompt.__wrapped__()
+        self.assertNotIn("PORTION REFERENCES", core)
+        self.assertNotIn("CHALLENGING IMAGES", core)
+        self.assertIn("mango juice = MANGO JUICE", core)
+        self.assertIn("PORTION REFERENCES", get_prompt_rulebook())
+
+    def test_caption_first_rule_kept(self):
+        """Caption-first rule survives prompt compaction"""
+        self.assertIn("mango juice = MANGO JUICE", CALORIE_ANALYSIS_PROMPT)
+
+class TestCaptionTemplate(unittest.TestCase):
+    """Test the per-request caption template"""
+
+    def test_caption_template_is_small(self):
+        """Only a short template is formatted per request"""
+        self.assertLess(len(CAPTION_OVERRIDE_TEMPLATE), len(CALORIE_ANALYSIS_PROMPT) // 5)
+
+    def test_caption_with_braces(self):
+        """Braces in the caption are inserted literally"""
+        rendered = CAPTION_OVERRIDE_TEMPLATE.format(caption="{weird} mango juice")
+        self.assertIn('"{weird} mango juice"', rendered)
+
+    def test_caption_block_cached(self):
+        """Repeated captions reuse the rendered block"""
+        from ai.prompts import render_caption_block
+        self.assertIs(render_caption_block("coffee"), render_caption_block("coffee"))
+        self.assertEqual(render_caption_block(None), "")
+        self.assertEqual(render_caption_block("coffee"), CAPTION_OVERRIDE_TEMPLATE.format(caption="coffee"))
+
+class TestCalorieMessages(unittest.TestCase):
+    """Test the static/dynamic message split"""
+
+    def test_static_prefix_identical_across_requests(self):
+        """System message is the same object for every request"""
+        first = build_calorie_messages("aaa", None, 1)
+        second = build_calorie_messages("bbb", None, 2)
+        self.assertIs(first[0], second[0])
+        self.assertIs(build_calorie_messages("aaa", "mango juice", 1)[0],
+                      build_calorie_messages("bbb", "coffee", 2)[0])
+        self.assertEqual(first[0]['content'][0]['cache_control'], {"type": "ephemeral"})
+
+    def test_caption_routes_to_short_prompt(self):
+        """Captioned photos skip the challenging-image guidance; uncaptioned ones keep it"""
+        captioned = build_calorie_messages("aaa", "mango juice", 1)[0]['content'][0]['text']
+        uncaptioned = build_calorie_messages("aaa", "", 1)[0]['content'][0]['text']
+        self.assertEqual(captioned, get_prompt(fast=True))
+        self.assertNotIn("CHALLENGING IMAGES", captioned)
+        self.assertIn("CHALLENGING IMAGES", uncaptioned)
+
+    def test_prompt_blocks_cacheable(self):
+        """Static prompt blocks are shared and marked for provider caching"""
+        from ai.prompts import get_calorie_prompt_blocks
+        blocks = get_calorie_prompt_blocks()
+        self.assertIs(build_calorie_messages("aaa", None, 1)[0]['content'], blocks)
+        self.assertEqual(blocks[0]['cache_control'], {"type": "ephemeral"})
+        self.assertEqual(get_calorie_prompt_blocks(fast=True)[0]['text'], get_prompt(fast=True))
+
+    def test_static_prefix_first_for_any_caption(self):
+        """Rendered requests always start with the unmodified static prompt"""
+        from ai.prompts import CALORIE_ANALYSIS_PROMPT_STATIC
+        captions = [None, "", "coffee", "mango juice", "2 slices pizza", "grilled chicken 200g",
+                    "{braces}", "$dollar", "naan bread\nwith curry", "ABSOLUTE CRITICAL RULE"]
+        for caption in captions:
+            messages = build_calorie_messages("aaa", caption, 1)
+            rendered = "".join(part['text'] for message in messages
+                               for part in message['content'] if part['type'] == 'text')
+            static = get_prompt(fast=True) if caption else CALORIE_ANALYSIS_PROMPT_STATIC
+            self.assertTrue(rendered.startswith(static))
+            self.assertEqual(messages[0]['content'][0]['text'], static)
+            self.assertEqual(messages[-1]['role'], 'user')
+
+    def test_dynamic_suffix_in_user_message(self):
+        """Caption, timestamp and image are carried only in the user message"""
+        messages = build_calorie_messages("aaa", "mango juice", 123)
+        user_text = messages[1]['content'][0]['text']
+        self.assertIn('"mango juice"', user_text)
+        self.assertIn("123", user_text)
+        self.assertEqual(messages[1]['content'][1]['image_url']['url'], "data:image/jpeg;base64,aaa")
+        self.assertNotIn("mango juice", build_calorie_messages("aaa", None, 1)[1]['content'][0]['text'])
+        webp = build_calorie_messages("aaa", None, 1, mime_type="image/webp")
+        self.assertEqual(webp[1]['content'][1]['image_url']['url'], "data:image/webp;base64,aaa")
+
+    def test_batch_messages_share_static_prefix(self):
+        """Multi-image requests reuse the single-image system message"""
+        batch = build_batch_calorie_messages(
+            [("aaa", "coffee", None), ("bbb", None, None), ("ccc", None, "https://bucket/photo")], 1
+        )
+        self.assertIs(batch[0], build_calorie_messages("ccc", None, 1)[0])
+        content = batch[1]['content']
+        self.assertEqual([part['image_url']['url'] for part in content if part['type'] == 'image_url'],
+                         ["data:image/jpeg;base64,aaa", "data:image/jpeg;base64,bbb", "https://bucket/photo"])
+        self.assertIn('"coffee"', content[1]['text'])
+        self.assertIn("exactly 3 analyses", content[0]['text'])
+
+class TestCalorieSchema(unittest.TestCase):
+    """Test the structured-output schema"""
+
+    def test_required_fields_are_defined(self):
+        """Every required field has a property definition"""
+        properties = CALORIE_JSON_SCHEMA['properties']
+        for field in CALORIE_JSON_SCHEMA['required']:
+            self.assertIn(field, properties)
+
+    def test_schema_not_duplicated_in_prompt(self):
+        """The example JSON object is no longer spelled out in the prompt"""
+        self.assertNotIn('"calories": 250', CALORIE_ANALYSIS_PROMPT)
+        self.assertNotIn("Return ONLY valid JSON", CALORIE_ANALYSIS_PROMPT)
+
+    def test_schema_replaces_format_instructions(self):
+        """Prompt defers to the schema instead of spelling out fields"""
+        self.assertIn("Fill the provided JSON schema.", CALORIE_ANALYSIS_PROMPT)
+        self.assertNotIn("YOU MUST INCLUDE ALL FIELDS", CALORIE_ANALYSIS_PROMPT)
+        self.assertNotIn("total_calories", CALORIE_ANALYSIS_PROMPT)
+        self.assertNotIn("must be pure numbers", CALORIE_ANALYSIS_PROMPT)
+
+    def test_schema_is_strict(self):
+        """Strict mode needs every property typed and required, and no extras, at every level"""
+        from ai.prompts import get_response_schema
+
+        def check(schema):
+            self.assertIn('type', schema)
+            if schema['type'] == 'array':
+                check(schema['items'])
+            elif schema['type'] == 'object':
+                self.assertEqual(set(schema['required']), set(schema['properties']))
+                self.assertFalse(schema['additionalProperties'])
+                for prop in schema['properties'].values():
+                    check(prop)
+
+        for short_keys in (False, True):
+            for batch in (False, True):
+                check(get_response_schema(short_keys, batch))
+
+class TestShortKeys(unittest.TestCase):
+    """Test abbreviated wire keys"""
+
+    def test_short_schema_is_consistent(self):
+        """Short schema keeps every field and its required list matches its properties"""
+        from ai.prompts import get_response_schema, SHORT_KEYS
+        schema = get_response_schema(short_keys=True)
+        self.assertEqual(len(schema['properties']), len(CALORIE_JSON_SCHEMA['properties']))
+        for field in schema['required']:
+            self.assertIn(field, schema['properties'])
+        self.assertIn(SHORT_KEYS['cooking_method'], schema['properties']['fi']['items']['properties'])
+        self.assertIn("total_calories", schema['properties']['tc']['description'])
+
+    def test_expand_keys(self):
+        """Short keys expand recursively and long keys pass through"""
+        from ai.prompts import expand_keys
+        wire = {"tc": 450, "hc": "junk", "fi": [{"name": "Fries", "cm": "fried"}], "description": "Fries"}
+        self.assertEqual(expand_keys(wire), {
+            "total_calories": 450, "health_category": "junk",
+            "food_items": [{"name": "Fries", "cooking_method": "fried"}], "description": "Fries"
+        })
+        self.assertEqual(expand_keys({"total_calories": 1}), {"total_calories": 1})
+
+class TestSharedFragments(unittest.TestCase):
+    """Test the description and confidence prompts"""
+
+    def test_fragments_loaded_once(self):
+        """Module constants are the cached file contents"""
+        from ai import prompts
+        self.assertIs(prompts.MEAL_DESCRIPTION_PROMPT, prompts.get_meal_description_prompt())
+        self.assertIs(prompts.CONFIDENCE_EXPLANATION_PROMPT, prompts.get_confidence_prompt())
+        self.assertIn("food diary entry", prompts.MEAL_DESCRIPTION_PROMPT)
+
+    def test_ignore_block_not_duplicated(self):
+        """Non-food ignore list and focus guidance appear once in the meal description prompt"""
+        from ai.prompts import MEAL_DESCRIPTION_PROMPT
+        self.assertEqual(MEAL_DESCRIPTION_PROMPT.count("IGNORE THESE ITEMS"), 1)
+        self.assertEqual(MEAL_DESCRIPTION_PROMPT.lower().count("focus only on"), 1)
+        self.assertNotIn("\ufffd", MEAL_DESCRIPTION_PROMPT)
+
+    def test_format_rules_shared(self):
+        """Calorie and description prompts splice in the same format rules"""
+        from ai.prompts import MEAL_DESCRIPTION_PROMPT, _read_prompt_file
+        rules = _read_prompt_file("format_rules.txt")
+        self.assertIn(rules, MEAL_DESCRIPTION_PROMPT)
+        self.assertIn(rules, CALORIE_ANALYSIS_PROMPT)
+        self.assertIn(rules, get_prompt(fast=True))
+        for prompt in (MEAL_DESCRIPTION_PROMPT, CALORIE_ANALYSIS_PROMPT):
+            self.assertEqual(prompt.lower().count("comma-separated"), 1)
+            self.assertEqual(prompt.count("A meal consisting"), 1)
+
+    def test_description_uses_single_exemplar(self):
+        """Description prompt carries one JSON exemplar instead of prose example lists"""
+        import json
+        from ai.prompts import MEAL_DESCRIPTION_PROMPT
+        self.assertNotIn("FORMAT EXAMPLES", MEAL_DESCRIPTION_PROMPT)
+        exemplar = next(line for line in MEAL_DESCRIPTION_PROMPT.splitlines() if line.startswith("{"))
+        self.assertEqual(json.loads(exemplar)["description"], "Mango Juice (400ml), Naan Bread")
+
+    def test_description_prompt_token_budget(self):
+        """Description prompt stays under its budget, which a second ignore block would exceed"""
+        from ai.prompts import MEAL_DESCRIPTION_PROMPT
+        self.assertLess(count_tokens(MEAL_DESCRIPTION_PROMPT, PROMPT_TOKENIZER), MAX_DESCRIPTION_PROMPT_TOKENS)
+
+class TestEnhancedPrompt(unittest.TestCase):
+    """Test the health warning prompt"""
+
+    def test_metrics_substituted(self):
+        """User metrics fill every placeholder without touching unrelated figures"""
+        from ai.prompts import get_enhanced_prompt
+        prompt = get_enhanced_prompt({'visceral_fat': 12.5, 'body_fat': 22, 'muscle_mass': 40,
+                                      'metabolic_age': 33, 'bmi': 24})
+        self.assertIn("Visceral Fat: 12.5", prompt)
+        self.assertIn("Your 12.5 visceral fat", prompt)
+        self.assertIn("Body Fat: 22%", prompt)
+        self.assertIn("Metabolic Age: 33 years", prompt)
+        self.assertIn("BMI: 24", prompt)
+        self.assertIn("impair cognition by 30%", prompt)
+        self.assertNotIn("16.8", prompt)
+        self.assertNotIn("${", prompt)
+
+    def test_no_emoji(self):
+        """Health warning prompt uses plain headings instead of emoji"""
+        from ai.prompts import get_enhanced_prompt
+        self.assertEqual(EMOJI_PATTERN.findall(get_enhanced_prompt()), [])
+
+    def test_repeat_metrics_cached(self):
+        """Same metrics return the cached render"""
+        from ai.prompts import get_enhanced_prompt
+        self.assertIs(get_enhanced_prompt(), get_enhanced_prompt({'visceral_fat': 16.8}))
+
+    def test_default_metrics_short_circuit(self):
+        """No metrics and the default metrics render the same prompt"""
+        from ai.prompts import DEFAULT_HEALTH_CONTEXT, get_enhanced_prompt
+        self.assertIs(get_enhanced_prompt(None), get_enhanced_prompt(dict(DEFAULT_HEALTH_CONTEXT)))
+        self.assertIs(get_enhanced_prompt({}), get_enhanced_prompt(None))
+        self.assertIn("Visceral Fat: 16.8", get_enhanced_prompt())
+
+class TestWarningTemplates(unittest.TestCase):
+    """Test warning template formatting"""
+
+    def test_format_warning(self):
+        """Known placeholders are filled and missing ones left intact"""
+        from ai.prompts import format_warning
+        text = format_warning('excessive_calories', calories=1200, fat_gain=40)
+        self.assertIn("1200 calories", text)
+        self.assertIn("40g", text)
+        self.assertIn("${vf_level}", format_warning('high_sugar'))
+
+class TestCriticalThresholds(unittest.TestCase):
+    """Test the shared health thresholds"""
+
+    def test_thresholds_shared_and_read_only(self):
+        """The same read-only mapping is returned on every call"""
+        from ai.prompts import get_critical_thresholds
+        thresholds = get_critical_thresholds()
+        self.assertIs(thresholds, get_critical_thresholds())
+        with self.assertRaises(TypeError):
+            thresholds['visceral_fat']['critical'] = (0, 0)
+
+    def test_range_membership(self):
+        """Ranges compare as tuples and test membership inclusively"""
+        from ai.prompts import get_critical_thresholds
+        critical = get_critical_thresholds()['visceral_fat']['critical']
+        self.assertEqual(critical, (16, 30))
+        self.assertIn(16.8, critical)
+        self.assertIn(30, critical)
+        self.assertNotIn(15.9, critical)
+
+    def test_severity_boundaries(self):
+        """Each severity band starts at its threshold"""
+        from ai.prompts import format_warning_by_severity
+        self.assertEqual(format_warning_by_severity(9.9), "📊 HEALTH ANALYSIS")
+        self.assertIn("WARNING", format_warning_by_severity(10))
+        self.assertIn("DANGER ZONE", format_warning_by_severity(13))
+        self.assertIn("CRITICAL", format_warning_by_severity(16.8))
+        self.assertIn("MEDICAL EMERGENCY", format_warning_by_severity(18))
+        self.assertIn("MEDICAL EMERGENCY", format_warning_by_severity(40))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -14,6 +14,12 @@ class Config:
     OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
     OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'google/gemini-2.5-flash-preview:thinking')
     OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+    # Optional cheap vision model tried first; results below the confidence
+    # threshold are re-analyzed by OPENROUTER_MODEL. Empty disables the cascade
+    OPENROUTER_FAST_MODEL = os.getenv('OPENROUTER_FAST_MODEL', '')
+    CASCADE_MIN_CONFIDENCE = float(os.getenv('CASCADE_MIN_CONFIDENCE', 75))
+    # Comma-separated provider quantizations to route to (e.g. fp8,int8); empty allows any
+    OPENROUTER_QUANTIZATIONS = [q.strip() for q in os.getenv('OPENROUTER_QUANTIZATIONS', '').split(',') if q.strip()]
     
     # Database Configuration
     DATABASE_TYPE = os.getenv('DATABASE_TYPE', 'sqlite')  # 'sqlite' or 'mysql'
@@ -31,8 +37,78 @@ class Config:
     SSH_USER = os.getenv('SSH_USER', '')
     SSH_PASSWORD = os.getenv('SSH_PASSWORD', '')
     
+    # SQLite file caching finished analyses; empty (the default) disables it, so
+    # nothing is written to the working directory unless a path is configured
+    ANALYSIS_CACHE_PATH = os.getenv('ANALYSIS_CACHE_PATH', '')
+    # Hours a cached analysis stays valid
+    ANALYSIS_CACHE_TTL_HOURS = float(os.getenv('ANALYSIS_CACHE_TTL_HOURS', 24))
+    # Max perceptual-hash bit distance for reusing an analysis of a near-identical photo
+    # with the same caption; negative disables near-duplicate reuse. Off by default:
+    # the cache is shared by all users, so one user's similar-looking meal would be
+    # served to another
+    SEMANTIC_CACHE_MAX_DISTANCE = int(os.getenv('SEMANTIC_CACHE_MAX_DISTANCE', -1))
+
+    # Send concurrent photos as one multi-image request instead of one request each;
+    # ignored while OPENROUTER_FAST_MODEL is set, so every photo gets the cheap first pass
+    MULTI_IMAGE_BATCHING = os.getenv('MULTI_IMAGE_BATCHING', 'true').lower() == 'true'
+    # Photos arriving within this window (or until this many are queued) are
+    # coalesced into one batch; the window only applies while another batch is
+    # in flight, so a lone photo is sent at once. BATCH_MAX_SIZE * 4 updates
+    # are handled concurrently so photos from different users can meet here
+    BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 8))
+    BATCH_MAX_WAIT_MS = int(os.getenv('BATCH_MAX_WAIT_MS', 100))
+
+    # Output token cap per analyzed photo; a complete analysis is typically
+    # 300-500 tokens and decode time grows with every token allowed. A reply
+    # cut off at the cap is closed and recovered; thinking variants get a
+    # separate higher floor
+    ANALYSIS_MAX_TOKENS = int(os.getenv('ANALYSIS_MAX_TOKENS', 500))
+
+    # Ask the model for abbreviated JSON keys (expanded on parse) to cut output tokens
+    SHORT_JSON_KEYS = os.getenv('SHORT_JSON_KEYS', 'true').lower() == 'true'
+
+    # Send the portion/challenging-image rulebook with every request; turn off
+    # when OPENROUTER_MODEL is fine-tuned on ai.prompts.get_prompt_rulebook()
+    PROMPT_RULEBOOK_IN_CONTEXT = os.getenv('PROMPT_RULEBOOK_IN_CONTEXT', 'true').lower() == 'true'
+
+    # Stream analyses so the meal and calorie headline can be shown before the
+    # full breakdown has been generated
+    STREAM_ANALYSIS = os.getenv('STREAM_ANALYSIS', 'false').lower() == 'true'
+    # Stream and stop generating once this top-level field starts (e.g.
+    # 'notes', which users never see); empty reads the whole reply
+    STREAM_STOP_FIELD = os.getenv('STREAM_STOP_FIELD', '')
+
+    # Most API requests in flight at once, and requests started per minute
+    # (0 disables the rate limit); set to the provider's quota
+    API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', 32))
+    API_REQUESTS_PER_MINUTE = int(os.getenv('API_REQUESTS_PER_MINUTE', 250))
+
+    # Fail fast for COOLDOWN seconds after THRESHOLD consecutive analyses
+    # fail with timeouts, connection errors or 429/5xx on every model
+    CIRCUIT_BREAKER_THRESHOLD = int(os.getenv('CIRCUIT_BREAKER_THRESHOLD', 5))
+    CIRCUIT_BREAKER_COOLDOWN = float(os.getenv('CIRCUIT_BREAKER_COOLDOWN', 30))
+
+    # Gzip request bodies (Content-Encoding: gzip); the text prompts shrink
+    # several-fold, the base64 image by about a quarter. Only enable for
+    # endpoints that accept compressed requests
+    GZIP_REQUESTS = os.getenv('GZIP_REQUESTS', 'false').lower() == 'true'
+    GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', 6))
+
+    # Upload photos to this S3-compatible bucket (needs boto3 and the usual
+    # AWS_* credentials) and send presigned URLs instead of inline base64;
+    # empty sends photos inline. Only for models that can fetch image URLs
+    IMAGE_UPLOAD_BUCKET = os.getenv('IMAGE_UPLOAD_BUCKET', '')
+    IMAGE_UPLOAD_ENDPOINT_URL = os.getenv('IMAGE_UPLOAD_ENDPOINT_URL', '')
+    IMAGE_UPLOAD_URL_TTL = int(os.getenv('IMAGE_UPLOAD_URL_TTL', 60))
+
     # Bot Configuration
     MAX_IMAGE_SIZE_MB = int(os.getenv('MAX_IMAGE_SIZE_MB', 10))
+    # Photos are downscaled to this long edge and recompressed before upload
+    ANALYSIS_IMAGE_MAX_EDGE = int(os.getenv('ANALYSIS_IMAGE_MAX_EDGE', 768))
+    ANALYSIS_IMAGE_QUALITY = int(os.getenv('ANALYSIS_IMAGE_QUALITY', 80))
+    # WEBP is roughly a third smaller than JPEG at the same quality; every
+    # configured model accepts it
+    ANALYSIS_IMAGE_FORMAT = os.getenv('ANALYSIS_IMAGE_FORMAT', 'WEBP').upper()
     SUPPORTED_IMAGE_FORMATS = os.getenv('SUPPORTED_IMAGE_FORMATS', 'jpg,jpeg,png,webp').split(',')
     
     @classmethod
@@ -4,10 +4,35 @@ import re
 from PIL import Image
 from datetime import datetime, date, timezone, timedelta
 from typing import List, Dict, Any, Optional, Union
+import json
 import logging
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 logger = logging.getLogger(__name__)
 
+# Escape tables built once so each string is escaped in a single translate() pass
+# Characters that need to be escaped in MarkdownV2
+_MARKDOWN_V2_ESCAPES = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}.!'})
+# Only the most problematic characters for basic markdown; more conservative
+# but safer than full MarkdownV2
+_MARKDOWN_SAFE_ESCAPES = str.maketrans({char: f'\\{char}' for char in '*_[]`'})
+_MARKDOWN_SAFE_STRIP = str.maketrans('', '', '*_[]`')
+# Recent-meal lines in the daily summary only escape emphasis markers
+_MARKDOWN_EMPHASIS_ESCAPES = str.maketrans({'*': '\\*', '_': '\\_'})
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_NUMBER_RE = re.compile(r'\d+\.?\d*')
+
 def image_to_base64(image_path: str) -> str:
     """Convert image file to base64 string"""
     try:
@@ -17,12 +42,26 @@ def image_to_base64(image_path: str) -> str:
         logger.error(f"Error converting image to base64: {e}")
         raise
 
-def pil_image_to_base64(image: Image.Image, format: str = "JPEG") -> str:
-    """Convert PIL Image to base64 string"""
+def pil_image_to_base64(image: Image.Image, format: str = "JPEG", quality: Optional[int] = None) -> str:
+    """Convert PIL Image to base64 string, optionally recompressing at the given encoder quality (JPEG/WEBP)"""
     try:
+        if cv2 is not None and quality is not None and format.upper() in ('JPEG', 'JPG'):
+            # OpenCV's libjpeg-turbo encoder is several times faster than Pillow's
+            pixels = np.asarray(image.convert('RGB'))[:, :, ::-1]
+            ok, encoded = cv2.imencode('.jpg', pixels, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                return base64.b64encode(encoded).decode('ascii')
+
         buffer = io.BytesIO()
-        image.save(buffer, format=format)
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        if quality is not None:
+            # optimize's extra Huffman pass roughly doubles JPEG encode time
+            # for a few percent fewer bytes
+            image.save(buffer, format=format, quality=quality, optimize=False)
+        else:
+            image.save(buffer, format=format)
+        # getbuffer() hands the encoder a view instead of copying the image;
+        # base64 output is pure ASCII, which decodes faster than UTF-8
+        return base64.b64encode(buffer.getbuffer()).decode('ascii')
     except Exception as e:
         logger.error(f"Error converting PIL image to base64: {e}")
         raise
@@ -277,12 +316,14 @@ def format_meal_summary(meals: List[Dict[str, Any]], user_timezone_offset: int =
     total_calories = sum(meal['calories'] for meal in meals)
     meal_count = len(meals)
 
-    summary = f"📊 **Today's Summary**\n\n"
-    summary += f"🍽️ **Meals logged:** {meal_count}\n"
-    summary += f"🔥 **Total calories:** {format_calories(total_calories)}\n\n"
+    parts = [
+        f"📊 **Today's Summary**\n\n"
+        f"🍽️ **Meals logged:** {meal_count}\n"
+        f"🔥 **Total calories:** {format_calories(total_calories)}\n\n"
+    ]
 
     if meal_count > 0:
-        summary += "**Recent meals:**\n"
+        parts.append("**Recent meals:**\n")
         for i, meal in enumerate(meals[-5:], 1):  # Show last 5 meals
             try:
                 # Use the new timezone-aware formatting function
@@ -290,28 +331,25 @@ def format_meal_summary(meals: List[Dict[str, Any]], user_timezone_offset: int =
 
                 # Truncate description and use simple escaping (not full MarkdownV2)
                 description = meal['description'][:50] + "..." if len(meal['description']) > 50 else meal['description']
-                # Only escape asterisks and underscores for basic markdown
-                description = description.replace('*', '\\*').replace('_', '\\_')
+                description = escape_markdown_emphasis(description)
 
-                summary += f"{i}. {description} - {format_calories(meal['calories'])} ({time_str})\n"
+                parts.append(f"{i}. {description} - {format_calories(meal['calories'])} ({time_str})\n")
             except Exception as e:
                 logger.warning(f"Error formatting meal {i}: {e}")
                 continue
 
-    return summary
+    return "".join(parts)
+
+def escape_markdown_emphasis(text: str) -> str:
+    """Escape only asterisks and underscores, for basic Markdown"""
+    return text.translate(_MARKDOWN_EMPHASIS_ESCAPES)
 
 def escape_markdown_v2(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2"""
     if not text:
         return ""
 
-    # Characters that need to be escaped in MarkdownV2
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-
-    return text
+    return text.translate(_MARKDOWN_V2_ESCAPES)
 
 def escape_markdown_safe(text: str) -> str:
     """Safely escape markdown characters with better error handling"""
@@ -320,26 +358,11 @@ def escape_markdown_safe(text: str) -> str:
 
     try:
         # Convert to string if not already
-        text = str(text)
-
-        # Only escape the most problematic characters for basic markdown
-        # This is more conservative but safer than full MarkdownV2
-        escape_chars = {
-            '*': '\\*',
-            '_': '\\_',
-            '[': '\\[',
-            ']': '\\]',
-            '`': '\\`'
-        }
-
-        for char, escaped in escape_chars.items():
-            text = text.replace(char, escaped)
-
-        return text
+        return str(text).translate(_MARKDOWN_SAFE_ESCAPES)
     except Exception as e:
         logger.warning(f"Error escaping markdown: {e}, returning plain text")
         # Return plain text without any markdown if escaping fails
-        return str(text).replace('*', '').replace('_', '').replace('[', '').replace(']', '').replace('`', '')
+        return str(text).translate(_MARKDOWN_SAFE_STRIP)
 
 def sanitize_input(text: str, max_length: int = 1000) -> str:
     """Sanitize user input text"""
@@ -347,7 +370,7 @@ def sanitize_input(text: str, max_length: int = 1000) -> str:
         return ""
 
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text.strip())
+    text = _WHITESPACE_RE.sub(' ', text.strip())
 
     # Limit length
     if len(text) > max_length:
@@ -355,6 +378,19 @@ def sanitize_input(text: str, max_length: int = 1000) -> str:
 
     return text
 
+def loads_json(data: Union[str, bytes]) -> Any:
+    """Parse JSON with orjson when installed, falling back to the stdlib.
+    Both raise json.JSONDecodeError on malformed input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps_json(value: Any) -> bytes:
+    """Serialize compact JSON to UTF-8 bytes with orjson when installed, falling back to the stdlib"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
 def parse_numeric_value(value: Union[str, int, float], default: float = 0.0) -> float:
     """Parse numeric values that might contain text like '100 calories' or '85%'"""
     if isinstance(value, (int, float)):
@@ -362,7 +398,7 @@ def parse_numeric_value(value: Union[str, int, float], default: float = 0.0) ->
 
     if isinstance(value, str):
         # Extract first number from string (handles "100 calories", "85%", etc.)
-        numbers = re.findall(r'\d+\.?\d*', str(value))
+        numbers = _NUMBER_RE.findall(value)
         if numbers:
             return float(numbers[0])
         else: